@@ -0,0 +1,3 @@
+# The Power BI report iframe both scrapers wait on after loading the report page.
+# Matches on the path so a relative src still counts.
+REPORT_IFRAME_SELECTOR = "iframe[src*='/powerbi/?id=']"
@@ -0,0 +1,18 @@
+import os
+import functools
+import boto3
+from botocore.config import Config
+
+@functools.lru_cache(maxsize=1)
+def get_s3_client():
+    """
+    One S3 client per process, built from the AWS_* environment variables. boto3 clients
+    are thread-safe, so every helper shares this one and its HTTPS connection pool.
+    """
+    return boto3.client(
+        "s3",
+        aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
+        aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        region_name=os.getenv("AWS_REGION"),
+        config=Config(max_pool_connections=32, retries={"mode": "standard", "max_attempts": 3})
+    )
@@ -1,27 +1,60 @@
 import os
-import io
+import re
 import json
+import time
+import logging
+import asyncio
 import string
+import hashlib
+import sqlite3
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Tuple, Optional
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 import pandas as pd
+from tenacity import retry, stop_after_attempt, wait_random_exponential, retry_if_exception_type
 
 try:
-    from openai import OpenAI
+    import orjson
+    _json_loads = orjson.loads
 except Exception:
+    _json_loads = json.loads
+
+try:
+    import openai
+    from openai import OpenAI, AsyncOpenAI
+except Exception:
+    openai = None
     OpenAI = None
+    AsyncOpenAI = None
 
+# Transient errors worth retrying; everything else fails the batch immediately
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError) if openai else ()
+
+from helpers._s3 import get_s3_client
 from helpers.categories_helper import S3_KEY as CATS_S3_KEY
+from helpers.csv_helper import read_csv_str
+from helpers.workbook_cache import read_excel_str
+
+log = logging.getLogger("ai_labeler")
+
+def _env_flag(name: str) -> bool:
+    # "1"/"true"/"yes" turn a flag on; unset, "false", "0" and anything else leave it off
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes")
 
 CATEGORIES = ["Pizza","Cafe","Bakery","Dessert","Pub","Deli","Fast Food","Restaurant","Mobile","Venue Dining","Other"]
 CUISINE_CATEGORIES = ["Mexican","Chinese","Japanese","Thai","Indian","Mediterranean","Greek","Middle Eastern","Korean","Vietnamese","Italian","BBQ","Seafood","American","Caribbean","Latin American","Other"]
 
+# Membership lookups; the lists above keep their order for the prompt
+_CATEGORIES_SET = frozenset(CATEGORIES)
+_CUISINES_SET = frozenset(CUISINE_CATEGORIES)
+
 def normalize_strict(cat: str) -> str:
-    return cat if cat in CATEGORIES else "Other"
+    return cat if cat in _CATEGORIES_SET else "Other"
 
 def normalize_cuisine(cat: str) -> str:
-    return cat if cat in CUISINE_CATEGORIES else "Other"
+    return cat if cat in _CUISINES_SET else "Other"
 
 AI_PROMPT_HEADER = """
 You classify Pennsylvania restaurant/food-establishment inspections.
@@ -35,6 +68,9 @@ Return EXACTLY:
 - confidence: 0–1
 - rationale: one brief sentence citing evidence used.
 
+Input is tab-separated with a header row: id, facility, address, city, evidence.
+Evidence fields are "name: value" pairs separated by " | " and may be empty.
+
 Rules:
 1) Use ONLY the establishment fields provided. Do not invent details.
 2) Prefer specific strict_category over general; if unclear, use "Other".
@@ -42,6 +78,16 @@ Rules:
 4) Output JSON ONLY, one object per line (JSONL) with keys: "id","strict_category","cuisine","ai_category","confidence","rationale".
 """.strip()
 
+# Rendered once; it only depends on the module-level category lists
+_SYSTEM_PREFIX = "\n\n".join([
+    "You are a careful, terse classifier that replies in strict JSON lines.",
+    AI_PROMPT_HEADER.format(
+        allowed_categories="\n".join(f"- {c}" for c in CATEGORIES),
+        allowed_cuisines="\n".join(f"- {c}" for c in CUISINE_CATEGORIES),
+    ),
+    "Classify each establishment in the user message. Output JSONL (one JSON object per line) with keys: id, strict_category, cuisine, ai_category, confidence, rationale.",
+])
+
 EVIDENCE_ORDER = [
     "program","facility_type","facility kind","license_type",
     "inspection_type","inspection_purpose","purpose",
@@ -49,30 +95,94 @@ EVIDENCE_ORDER = [
     "violations","violation","violation_description","notes","remarks","comments"
 ]
 
+# Facility names that classify themselves; these skip the LLM entirely
+_LOCAL_RULES = [
+    (re.compile(r"\bpizz(a|eria)\b", re.I), "pizza"),
+    (re.compile(r"\bbaker(y|ies)\b", re.I), "bakery"),
+    (re.compile(r"\b(cafe|café)\b", re.I), "cafe"),
+    (re.compile(r"\bdeli\b", re.I), "deli"),
+]
+
+def _local_label(facility: str) -> Optional[str]:
+    for pat, label in _LOCAL_RULES:
+        if pat.search(facility):
+            return label
+    return None
+
 _PUNCT_TABLE = str.maketrans({c: " " for c in string.punctuation})
 def _simplify_name(s: str) -> str:
     if not isinstance(s, str): return "unknown"
     t = " ".join([w for w in s.strip().lower().translate(_PUNCT_TABLE).split() if w])
     return t or "unknown"
 
-def _allowed_lists_text() -> Tuple[str, str]:
-    allowed_cats = "\n".join(f"- {c}" for c in CATEGORIES)
-    allowed_cuis = "\n".join(f"- {c}" for c in CUISINE_CATEGORIES)
-    return allowed_cats, allowed_cuis
-
 def _excerpt(text: str, max_words: int = 50) -> str:
     if not isinstance(text, str): return ""
-    parts = text.strip().split()
-    return text.strip() if len(parts) <= max_words else " ".join(parts[:max_words]) + " …"
-
-def _gather_evidence(ins: pd.DataFrame, fac: str, addr: str, city: str) -> str:
-    m = (ins["facility"].fillna("")==fac) & (ins["address"].fillna("")==addr) & (ins["city"].fillna("")==city)
-    row = ins.loc[m].head(1)
-    if row.empty: return ""
-    r = row.iloc[0].to_dict()
+    text = text.strip()
+    # maxsplit stops scanning after max_words words instead of tokenizing the whole text
+    parts = text.split(None, max_words)
+    return text if len(parts) <= max_words else " ".join(parts[:max_words]) + " …"
+
+def _normalize_keys(df: pd.DataFrame) -> pd.DataFrame:
+    # One cleaning pass at load; join keys repeat heavily so categoricals halve their memory
+    for c in ["facility","address","city"]:
+        df[c] = df[c].fillna("").astype(str).str.strip().astype("category")
+    return df
+
+def _build_ins_lookup(ins: pd.DataFrame) -> Dict[Tuple[str, str, str], Dict]:
+    """First inspection row per (facility, address, city), for O(1) evidence lookups."""
+    keys = ["facility","address","city"]
+    return ins.drop_duplicates(keys).set_index(keys).to_dict(orient="index")
+
+class _DuckDBEvidenceLookup:
+    """
+    Same .get((facility, address, city)) interface as the dict index, but keeps the
+    inspections sheet in an in-process DuckDB table instead of a pandas frame.
+    Enable with AI_EVIDENCE_BACKEND=duckdb for very large inspection files.
+    """
+    def __init__(self, path: str):
+        import duckdb
+        self.con = duckdb.connect()
+        try:
+            self.con.execute("INSTALL excel; LOAD excel;")
+            self.con.execute("CREATE TABLE ins AS SELECT * FROM read_xlsx(?, all_varchar = true)", [path])
+        except duckdb.Error as e:
+            # excel extension unavailable (e.g. offline runner): the sheet goes through pandas once,
+            # so the load itself is not memory-light; only the key/evidence columns are kept
+            print(f"⚠️ DuckDB read_xlsx unavailable ({e}); falling back to loading {path} via pandas.")
+            df = read_excel_str(path)
+            df = df[[c for c in ["facility","address","city",*EVIDENCE_ORDER] if c in df.columns]]
+            self.con.register("ins_df", df)
+            self.con.execute("CREATE TABLE ins AS SELECT * FROM ins_df")
+            self.con.unregister("ins_df")
+            del df
+        self.columns = [r[0] for r in self.con.execute("DESCRIBE ins").fetchall()]
+        for col in ["facility","address","city"]:
+            if col not in self.columns:
+                raise RuntimeError(f"'{col}' missing from {path}")
+        # Strip the same characters str.strip() does (tabs, newlines, NBSP...), not just spaces
+        ws = "".join(ch for ch in map(chr, range(0x110000)) if ch.isspace())
+        self.con.execute(
+            "UPDATE ins SET facility = trim(coalesce(facility, ''), $ws), "
+            "address = trim(coalesce(address, ''), $ws), city = trim(coalesce(city, ''), $ws)",
+            {"ws": ws},
+        )
+        self.con.execute("CREATE INDEX i_key ON ins(facility, address, city)")
+        self.evidence_cols = [c for c in EVIDENCE_ORDER if c in self.columns]
+        select = ", ".join(f'"{c}"' for c in self.evidence_cols) or "1"
+        # rowid follows sheet order, so duplicates resolve to the first row like the dict index
+        self._sql = f"SELECT {select} FROM ins WHERE facility = ? AND address = ? AND city = ? ORDER BY rowid LIMIT 1"
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[Dict]:
+        row = self.con.execute(self._sql, list(key)).fetchone()
+        if row is None: return None
+        return {c: (v or "") for c, v in zip(self.evidence_cols, row)}
+
+def _gather_evidence(ins_lookup, ins_columns, fac: str, addr: str, city: str) -> str:
+    r = ins_lookup.get((fac, addr, city))
+    if r is None: return ""
     out = []
     for col in EVIDENCE_ORDER:
-        if col in ins.columns:
+        if col in ins_columns:
             val = str(r.get(col, "") or "").strip()
             if not val: continue
             if col in {"violations","violation","violation_description","notes","remarks","comments"}:
@@ -80,25 +190,20 @@ def _gather_evidence(ins: pd.DataFrame, fac: str, addr: str, city: str) -> str:
             out.append(f"{col}: {val}")
     return "\n".join(out)
 
-def _build_batch_prompt(items: List[Dict], evidence_map: Dict[int, str]) -> str:
-    allowed_cats, allowed_cuis = _allowed_lists_text()
-    lines = [
-        AI_PROMPT_HEADER.format(allowed_categories=allowed_cats, allowed_cuisines=allowed_cuis),
-        "Classify each establishment below. Output JSONL (one JSON object per line) with keys: id, strict_category, cuisine, ai_category, confidence, rationale.",
-        "",
-    ]
+def _tsv_field(v: str) -> str:
+    return v.replace("\t", " ").replace("\r", " ").replace("\n", " ")
+
+def _build_batch_prompt(items: List[Dict], evidence_map: Dict[int, str]) -> Tuple[str, str]:
+    """
+    Returns (system_prefix, user_body). The system prefix is byte-identical on
+    every call so OpenAI's automatic prompt caching can reuse it across batches.
+    """
+    lines = ["id\tfacility\taddress\tcity\tevidence"]
     for it in items:
-        lines.append(
-            f"id: {it['id']}\n"
-            f"Facility: {it['facility']}\n"
-            f"Address: {it['address']}\n"
-            f"City: {it['city']}\n"
-        )
-        ev = evidence_map.get(it["id"], "")
-        if ev:
-            lines.append(f"EVIDENCE:\n{ev}\n")
+        ev = evidence_map.get(it["id"], "").replace("\n", " | ")
+        lines.append("\t".join(_tsv_field(v) for v in (str(it["id"]), it["facility"], it["address"], it["city"], ev)))
     lines.append("\nReturn ONLY JSON lines, no markdown.")
-    return "\n".join(lines)
+    return _SYSTEM_PREFIX, "\n".join(lines)
 
 def _parse_jsonl(s: str) -> List[Dict]:
     s = s.replace("```json", "```").replace("```", "")
@@ -108,18 +213,143 @@ def _parse_jsonl(s: str) -> List[Dict]:
         if not line or "{" not in line or "}" not in line: continue
         try:
             start = line.find("{"); end = line.rfind("}") + 1
-            out.append(json.loads(line[start:end]))
+            out.append(_json_loads(line[start:end]))
         except Exception:
             continue
     return out
 
-def _openai_client():
-    if OpenAI is None:
+def _openai_client(use_async: bool = True):
+    if OpenAI is None or AsyncOpenAI is None:
         raise RuntimeError("OpenAI SDK not installed. Run: pip install 'openai>=1.0.0'")
     key = os.getenv("OPENAI_API_KEY")
     if not key:
         raise RuntimeError("OPENAI_API_KEY not set in environment.")
-    return OpenAI(api_key=key)
+    # Chat calls retry through tenacity in _call_llm, so the async client must not retry
+    # on its own as well; the Batch API's sync calls keep the SDK's default retries.
+    return AsyncOpenAI(api_key=key, max_retries=0) if use_async else OpenAI(api_key=key)
+
+def _chat_messages(prompt: Tuple[str, str]) -> List[Dict]:
+    system_prefix, user_body = prompt
+    return [
+        {"role":"system","content":system_prefix},
+        {"role":"user","content":user_body},
+    ]
+
+@retry(
+    wait=wait_random_exponential(min=1, max=30),
+    stop=stop_after_attempt(int(os.getenv("AI_MAX_ATTEMPTS", "5"))),
+    retry=retry_if_exception_type(_RETRYABLE_ERRORS),
+    reraise=True,
+)
+async def _call_llm(client, model: str, prompt: Tuple[str, str]) -> str:
+    resp = await client.chat.completions.create(model=model, temperature=0, messages=_chat_messages(prompt))
+    return resp.choices[0].message.content or ""
+
+async def _run_batch(client, model: str, start: int, prompt: Tuple[str, str]) -> Optional[str]:
+    try:
+        return await _call_llm(client, model, prompt)
+    except Exception as e:
+        print(f"❌ OpenAI API error on batch starting {start}: {e}")
+        return None
+
+async def _run_pipeline(client, model: str, chunks: List[List[Dict]], chunk_evidence, prepare_batch, max_concurrency: int) -> List[Tuple[Tuple, Optional[str]]]:
+    """
+    Gather evidence for upcoming chunks in a worker thread while earlier batches
+    wait on the API. max_concurrency consumers cap the in-flight requests and
+    the queue keeps up to that many prepared batches ready ahead of them.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=max_concurrency)
+    results: List[Tuple[Tuple, Optional[str]]] = []
+
+    async def produce():
+        with ThreadPoolExecutor(max_workers=1) as tpe:
+            for chunk in chunks:
+                evidence = await loop.run_in_executor(tpe, chunk_evidence, chunk)
+                batch = prepare_batch(chunk, evidence)
+                if batch is not None:
+                    await queue.put(batch)
+        for _ in range(max_concurrency):
+            await queue.put(None)
+
+    async def consume():
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+            start, _, prompt = batch
+            results.append((batch, await _run_batch(client, model, start, prompt)))
+
+    await asyncio.gather(produce(), *[consume() for _ in range(max_concurrency)])
+    return results
+
+def _run_batch_api(client, model: str, batches: List[Tuple[int, List[Dict], Tuple[str, str]]]) -> List[Optional[str]]:
+    """
+    Submit every prompt as one OpenAI Batch API job and block until it finishes.
+    Half the token price of real-time calls, but turnaround can take up to 24h.
+    """
+    poll_seconds = int(os.getenv("AI_BATCH_POLL_SECONDS", "60"))
+    with tempfile.NamedTemporaryFile("w", suffix=".jsonl", encoding="utf-8", delete=False) as f:
+        for start, _, prompt in batches:
+            f.write(json.dumps({
+                "custom_id": str(start),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model, "temperature": 0, "messages": _chat_messages(prompt)},
+            }) + "\n")
+        requests_path = f.name
+    try:
+        with open(requests_path, "rb") as f:
+            input_file = client.files.create(file=f, purpose="batch")
+    finally:
+        os.remove(requests_path)
+
+    job = client.batches.create(input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h")
+    print(f"📦 Submitted OpenAI batch {job.id} with {len(batches)} requests.")
+    while job.status not in {"completed", "failed", "expired", "cancelled"}:
+        time.sleep(poll_seconds)
+        job = client.batches.retrieve(job.id)
+        print(f"⏳ OpenAI batch {job.id}: {job.status}")
+
+    if not job.output_file_id:
+        print(f"❌ OpenAI batch {job.id} ended with status '{job.status}' and no output.")
+        return [None] * len(batches)
+
+    texts: Dict[str, str] = {}
+    for line in client.files.content(job.output_file_id).text.splitlines():
+        if not line.strip(): continue
+        rec = json.loads(line)
+        choices = ((rec.get("response") or {}).get("body") or {}).get("choices") or []
+        if choices:
+            texts[rec["custom_id"]] = choices[0]["message"]["content"] or ""
+    print(f"✅ OpenAI batch {job.id} {job.status}: {len(texts)}/{len(batches)} responses.")
+    return [texts.get(str(start)) for start, _, _ in batches]
+
+def _label_from_row(r: Dict, facility: Optional[str]) -> str:
+    ai_cat = (r.get("ai_category") or "").strip()
+    if not ai_cat or ai_cat.lower() in {"unknown","other"}:
+        ai_cat = _simplify_name(facility) if facility is not None else "unknown"
+    return ai_cat
+
+def _cache_key(model: str, fac: str, addr: str, city: str, ev: str) -> str:
+    return hashlib.blake2b(f"{model}|{fac}|{addr}|{city}|{ev}".encode("utf-8")).hexdigest()[:32]
+
+def _open_response_cache() -> Optional[sqlite3.Connection]:
+    # Persists raw model rows keyed by establishment + evidence so reruns skip the API
+    # Lives under data/ by default, next to the other working files
+    path = os.getenv("AI_CACHE_PATH", "data/ai_cache.sqlite")
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE IF NOT EXISTS c(k TEXT PRIMARY KEY, v TEXT)")
+        return conn
+    except Exception as e:
+        print(f"ℹ️ AI response cache unavailable ({path}): {e}")
+        return None
+
+def _s3():
+    # The shared pooled client, so load + save reuse the same TLS connections
+    return get_s3_client()
 
 def _load_categories_df_from_s3_or_local() -> pd.DataFrame:
     AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
@@ -128,16 +358,16 @@ def _load_categories_df_from_s3_or_local() -> pd.DataFrame:
     AWS_REGION     = os.getenv("AWS_REGION")
     if AWS_ACCESS_KEY and AWS_SECRET_KEY and S3_BUCKET_NAME and AWS_REGION:
         try:
-            s3 = boto3.client("s3", aws_access_key_id=AWS_ACCESS_KEY, aws_secret_access_key=AWS_SECRET_KEY, region_name=AWS_REGION)
+            s3 = _s3()
             obj = s3.get_object(Bucket=S3_BUCKET_NAME, Key=CATS_S3_KEY)
             print("✅ Loaded categories.csv from S3 for labeling.")
-            return pd.read_csv(io.BytesIO(obj["Body"].read()), dtype=str)
+            return read_csv_str(obj["Body"])
         except Exception as e:
             print(f"ℹ️ Could not load S3 categories.csv: {e}")
     if os.path.exists("categories.csv"):
         try:
             print("ℹ️ Loaded local categories.csv for labeling.")
-            return pd.read_csv("categories.csv", dtype=str)
+            return read_csv_str("categories.csv")
         except Exception as e:
             print(f"❌ Error reading local categories.csv: {e}")
     return pd.DataFrame(columns=["facility","address","city","ai_category"])
@@ -151,19 +381,31 @@ def _save_categories_df(df: pd.DataFrame):
     AWS_REGION     = os.getenv("AWS_REGION")
     if AWS_ACCESS_KEY and AWS_SECRET_KEY and S3_BUCKET_NAME and AWS_REGION:
         try:
-            s3 = boto3.client("s3", aws_access_key_id=AWS_ACCESS_KEY, aws_secret_access_key=AWS_SECRET_KEY, region_name=AWS_REGION)
-            s3.put_object(Bucket=S3_BUCKET_NAME, Key=CATS_S3_KEY, Body=df.to_csv(index=False))
+            s3 = _s3()
+            # Upload the CSV just written instead of serializing it a second time in memory
+            s3.upload_file(
+                "categories.csv", S3_BUCKET_NAME, CATS_S3_KEY,
+                Config=TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=8, use_threads=True),
+            )
             print(f"✅ Wrote labeled categories to s3://{S3_BUCKET_NAME}/{CATS_S3_KEY}")
         except Exception as e:
             print(f"❌ Error uploading labeled categories.csv to S3: {e}")
 
-def label_categories_via_ai(local_inspections_file: str, limit: Optional[int] = None, model: str = "gpt-4o-mini") -> int:
+def label_categories_via_ai(local_inspections_file: str, limit: Optional[int] = None, model: str = "gpt-4o-mini", use_batch_api: Optional[bool] = None) -> int:
     try:
-        ins = pd.read_excel(local_inspections_file, dtype=str)
-        for col in ["facility","address","city"]:
-            if col not in ins.columns:
-                raise RuntimeError(f"'{col}' missing from {local_inspections_file}")
-            ins[col] = ins[col].fillna("").astype(str).str.strip()
+        if os.getenv("AI_EVIDENCE_BACKEND", "").lower() == "duckdb":
+            ins_lookup = _DuckDBEvidenceLookup(local_inspections_file)
+            ins_columns = set(ins_lookup.columns)
+        else:
+            ins = read_excel_str(local_inspections_file)
+            for col in ["facility","address","city"]:
+                if col not in ins.columns:
+                    raise RuntimeError(f"'{col}' missing from {local_inspections_file}")
+            # Only the join keys and evidence columns are ever read
+            keep = [c for c in ["facility","address","city",*EVIDENCE_ORDER] if c in ins.columns]
+            ins = _normalize_keys(ins[keep].fillna(""))
+            ins_lookup = _build_ins_lookup(ins)
+            ins_columns = set(ins.columns)
     except Exception as e:
         print(f"❌ Could not read {local_inspections_file}: {e}")
         return 0
@@ -172,9 +414,10 @@ def label_categories_via_ai(local_inspections_file: str, limit: Optional[int] =
     for c in ["facility","address","city","ai_category"]:
         if c not in cats.columns:
             cats[c] = ""
-        cats[c] = cats[c].fillna("").astype(str).str.strip()
+    cats["ai_category"] = cats["ai_category"].fillna("").astype(str).str.strip()
+    cats = _normalize_keys(cats)
 
-    mask = (cats["ai_category"].fillna("").astype(str).str.strip() == "")
+    mask = cats["ai_category"].eq("")
     pending = cats.loc[mask, ["facility","address","city"]].drop_duplicates()
     if isinstance(limit, int):
         pending = pending.head(limit)
@@ -182,70 +425,105 @@ def label_categories_via_ai(local_inspections_file: str, limit: Optional[int] =
         print("✅ No unlabeled rows found in categories.csv.")
         return 0
 
-    try:
-        client = _openai_client()
-    except Exception as e:
-        print(f"❌ OpenAI client error: {e}")
-        return 0
+    if use_batch_api is None:
+        use_batch_api = _env_flag("AI_USE_BATCH_API")
 
     batch_size = int(os.getenv("AI_BATCH_SIZE", "50"))
-    rows_list = pending.reset_index(drop=True).to_dict(orient="records")
+    max_concurrency = int(os.getenv("AI_MAX_CONCURRENCY", "20"))
 
-    applied_total = 0
-    for start in range(0, len(rows_list), batch_size):
-        chunk = rows_list[start:start+batch_size]
+    cache = _open_response_cache()
+
+    preds: List[Dict] = []
+    all_items = [
+        {"id": rid, "facility": f, "address": a, "city": c}
+        for rid, (f, a, c) in enumerate(pending[["facility","address","city"]].to_numpy().tolist())
+    ]
+    chunks = [all_items[i:i+batch_size] for i in range(0, len(all_items), batch_size)]
+
+    local_total = 0
+
+    def _chunk_evidence(chunk: List[Dict]) -> List[str]:
+        return [_gather_evidence(ins_lookup, ins_columns, it["facility"], it["address"], it["city"]) for it in chunk]
+
+    def _prepare_batch(chunk: List[Dict], evidence: List[str]):
+        # Keyword rules and cache hits resolve here, on the loop thread that owns the
+        # SQLite connection; only what's left goes into the batch sent to the model
+        nonlocal local_total
         items: List[Dict] = []
         evidence_map: Dict[int, str] = {}
-        for j, r in enumerate(chunk):
-            rid = start + j
-            fac, addr, city = r["facility"], r["address"], r["city"]
-            items.append({"id": rid, "facility": fac, "address": addr, "city": city})
-            ev = _gather_evidence(ins, fac, addr, city)
+        for it, ev in zip(chunk, evidence):
+            local = _local_label(it["facility"])
+            if local:
+                preds.append({"facility": it["facility"], "address": it["address"], "city": it["city"], "_pred": local})
+                local_total += 1
+                continue
+            it["cache_key"] = _cache_key(model, it["facility"], it["address"], it["city"], ev)
+            hit = cache.execute("SELECT v FROM c WHERE k=?", (it["cache_key"],)).fetchone() if cache else None
+            if hit:
+                preds.append({"facility": it["facility"], "address": it["address"], "city": it["city"], "_pred": _label_from_row(json.loads(hit[0]), it["facility"])})
+                continue
+            items.append(it)
             if ev:
-                evidence_map[rid] = ev
+                evidence_map[it["id"]] = ev
+        return (chunk[0]["id"], items, _build_batch_prompt(items, evidence_map)) if items else None
 
-        prompt = _build_batch_prompt(items, evidence_map)
-        try:
-            resp = client.chat.completions.create(
-                model=model,
-                temperature=0,
-                messages=[
-                    {"role":"system","content":"You are a careful, terse classifier that replies in strict JSON lines."},
-                    {"role":"user","content":prompt},
-                ],
-            )
-            text = resp.choices[0].message.content or ""
-        except Exception as e:
-            print(f"❌ OpenAI API error on batch starting {start}: {e}")
+    try:
+        client = _openai_client(use_async=not use_batch_api)
+    except Exception as e:
+        print(f"❌ OpenAI client error: {e}")
+        client = None
+
+    results: List[Tuple[Tuple, Optional[str]]] = []
+    if client is not None and not use_batch_api:
+        results = asyncio.run(_run_pipeline(client, model, chunks, _chunk_evidence, _prepare_batch, max_concurrency))
+    else:
+        # The Batch API needs every prompt up front; without a client only cache hits apply
+        batches = [b for b in (_prepare_batch(c, _chunk_evidence(c)) for c in chunks) if b is not None]
+        if client is not None and batches:
+            results = list(zip(batches, _run_batch_api(client, model, batches)))
+    if local_total:
+        print(f"🔤 Labeled {local_total} rows locally from facility-name keywords.")
+    cached_total = len(preds) - local_total
+    if cached_total:
+        print(f"♻️ Reused {cached_total} cached AI labels.")
+
+    # Apply results after the gather so cats is only mutated from this thread
+    cache_rows: List[Tuple[str, str]] = []
+    for (start, items, _), text in results:
+        if text is None:
             continue
 
         rows = _parse_jsonl(text)
+        items_by_id = {it["id"]: it for it in items}
         pred_map: Dict[int, str] = {}
         for r in rows:
             try:
                 rid = int(r.get("id"))
             except Exception:
                 continue
-            ai_cat = (r.get("ai_category") or "").strip()
-            if not ai_cat or ai_cat.lower() in {"unknown","other"}:
-                it = next((i for i in items if i["id"] == rid), None)
-                ai_cat = _simplify_name(it["facility"]) if it else "unknown"
-            pred_map[rid] = ai_cat
+            it = items_by_id.get(rid)
+            pred_map[rid] = _label_from_row(r, it["facility"] if it else None)
+            if it:
+                cache_rows.append((it["cache_key"], json.dumps(r)))
 
         for it in items:
-            rid = it["id"]
-            predicted = pred_map.get(rid, _simplify_name(it["facility"]))
-            m = (
-                (cats["facility"] == it["facility"]) &
-                (cats["address"] == it["address"]) &
-                (cats["city"]    == it["city"]) &
-                (cats["ai_category"].fillna("") == "")
-            )
-            if m.any():
-                cats.loc[m, "ai_category"] = predicted
-                applied = int(m.sum())
-                applied_total += applied
-                print(f"🤖 AI labeled: {it['facility']} | {it['address']} | {it['city']} → ai_category='{predicted}'")
+            predicted = pred_map.get(it["id"], _simplify_name(it["facility"]))
+            preds.append({"facility": it["facility"], "address": it["address"], "city": it["city"], "_pred": predicted})
+            log.debug("AI labeled: %s | %s | %s -> ai_category=%r", it["facility"], it["address"], it["city"], predicted)
+
+    if cache:
+        with cache:
+            cache.executemany("INSERT OR REPLACE INTO c(k, v) VALUES (?, ?)", cache_rows)
+        cache.close()
+
+    applied_total = 0
+    if preds:
+        preds_df = pd.DataFrame(preds).drop_duplicates(["facility","address","city"])
+        cats = cats.merge(preds_df, on=["facility","address","city"], how="left")
+        m = cats["ai_category"].eq("") & cats["_pred"].notna()
+        cats.loc[m, "ai_category"] = cats.loc[m, "_pred"]
+        cats.drop(columns="_pred", inplace=True)
+        applied_total = int(m.sum())
 
     if applied_total:
         _save_categories_df(cats)
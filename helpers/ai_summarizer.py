@@ -1,9 +1,10 @@
 import os
 import hashlib
 import io
-import boto3
 import pandas as pd
 from anthropic import Anthropic
+from helpers._s3 import get_s3_client
+from helpers.workbook_cache import read_excel_str, write_excel, write_snapshot
 
 BATCH_SIZE = 2000
 
@@ -55,12 +56,7 @@ def load_summaries_from_s3() -> pd.DataFrame:
     if not all([AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET_NAME, AWS_REGION]):
         print("Missing AWS credentials for summaries")
         return pd.DataFrame(columns=["comment_hash", "comment_text", "ai_summary", "created_at"])
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=AWS_REGION
-    )
+    s3_client = get_s3_client()
     summaries_key = "2025/restaurant-inspections/comment_summaries.csv"
     try:
         s3_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=summaries_key)
@@ -82,12 +78,7 @@ def save_summaries_to_s3(summaries_df: pd.DataFrame) -> bool:
     if not all([AWS_ACCESS_KEY, AWS_SECRET_KEY, S3_BUCKET_NAME, AWS_REGION]):
         print("Missing AWS credentials, cannot save summaries")
         return False
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=AWS_REGION
-    )
+    s3_client = get_s3_client()
     summaries_key = "2025/restaurant-inspections/comment_summaries.csv"
     try:
         csv_buffer = io.StringIO()
@@ -135,7 +126,7 @@ def summarize_comment(comment: str, api_key: str) -> dict:
 
 def add_ai_summaries(local_inspections_file: str) -> bool:
     try:
-        df = pd.read_excel(local_inspections_file, dtype=str)
+        df = read_excel_str(local_inspections_file)
         print(f"Loaded {len(df)} inspection rows")
         if "comment" not in df.columns:
             print("No comment column found")
@@ -234,7 +225,8 @@ def add_ai_summaries(local_inspections_file: str) -> bool:
         df["ai_summary"] = df.index.map(rejoined)
         df = df.drop(columns=["_orig_index", "_comment_parts"], errors="ignore")
 
-        df.to_excel(local_inspections_file, index=False)
+        write_excel(df, local_inspections_file)
+        write_snapshot(df, local_inspections_file)
         if new_summaries:
             print(f"\nToken Usage:")
             print(f"  Input tokens: {total_input_tokens:,}")
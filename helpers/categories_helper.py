@@ -1,16 +1,34 @@
 import os
-import io
-import boto3
+from concurrent.futures import Future, ThreadPoolExecutor
 import pandas as pd
+from typing import Optional, Tuple
+from helpers.csv_helper import read_csv_str
+from helpers.workbook_cache import read_excel_str, write_excel
 
 S3_KEY = "2025/restaurant-inspections/categories.csv"
 
-def _composite_key(df: pd.DataFrame) -> pd.Series:
-    """Internal stable key for dedupe/merge; not persisted."""
-    f = df["facility"].fillna("").astype(str).str.strip()
-    a = df["address"].fillna("").astype(str).str.strip()
-    c = df["city"].fillna("").astype(str).str.strip()
-    return f + "||" + a + "||" + c
+def _get_s3_client():
+    # The shared client; boto3 is only imported once a function needs it
+    from helpers._s3 import get_s3_client
+    return get_s3_client()
+
+def _aws_configured() -> bool:
+    return all(os.getenv(k) for k in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "S3_BUCKET_NAME", "AWS_REGION"))
+
+def _read_s3_categories() -> pd.DataFrame:
+    s3_obj = _get_s3_client().get_object(Bucket=os.getenv("S3_BUCKET_NAME"), Key=S3_KEY)
+    return read_csv_str(s3_obj["Body"])
+
+def _read_with_s3_prefetch(local_inspections_file: str) -> Tuple[pd.DataFrame, Optional[Future]]:
+    """
+    Read the inspections workbook while categories.csv downloads on a worker thread.
+    Errors from either side surface where they were handled before: the workbook read
+    raises here, the S3 fetch when its future's result() is taken.
+    """
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        remote = ex.submit(_read_s3_categories) if _aws_configured() else None
+        df = read_excel_str(local_inspections_file)
+    return df, remote
 
 def upsert_categories(local_inspections_file: str) -> str:
     """
@@ -21,7 +39,7 @@ def upsert_categories(local_inspections_file: str) -> str:
     Returns the local path written.
     """
     try:
-        df = pd.read_excel(local_inspections_file, dtype=str)
+        df, remote = _read_with_s3_prefetch(local_inspections_file)
     except Exception as e:
         print(f"❌ Could not read {local_inspections_file}: {e}")
         return ""
@@ -32,9 +50,10 @@ def upsert_categories(local_inspections_file: str) -> str:
         print(f"❌ {local_inspections_file} missing columns: {missing}")
         return ""
 
+    # Keys stay categorical through the dedupe steps so they hash int codes, not strings
     core = df[["facility", "address", "city"]].copy()
     for col in core.columns:
-        core[col] = core[col].fillna("").astype(str).str.strip()
+        core[col] = core[col].fillna("").astype(str).str.strip().astype("category")
 
     uniques = core.drop_duplicates().reset_index(drop=True)
     if "ai_category" not in uniques.columns:
@@ -49,21 +68,16 @@ def upsert_categories(local_inspections_file: str) -> str:
         print("❌ Missing AWS env vars; cannot read/write categories.csv in S3.")
         os.makedirs("data", exist_ok=True)
         local_only_path = "data/categories.csv"
-        uniques[["facility","address","city","ai_category"]].to_csv(local_only_path, index=False)
+        uniques = uniques[["facility","address","city","ai_category"]].astype(object)
+        uniques.to_csv(local_only_path, index=False)
         print(f"📝 Wrote local (not S3-backed) {local_only_path} with {len(uniques)} rows.")
         return local_only_path
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=AWS_REGION,
-    )
+    s3_client = _get_s3_client()
 
     existing = pd.DataFrame(columns=["facility", "address", "city", "ai_category"])
     try:
-        s3_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=S3_KEY)
-        existing = pd.read_csv(io.BytesIO(s3_obj["Body"].read()), dtype=str)
+        existing = remote.result() if remote else _read_s3_categories()
         for col in ["facility","address","city","ai_category"]:
             if col not in existing.columns:
                 existing[col] = ""
@@ -74,36 +88,32 @@ def upsert_categories(local_inspections_file: str) -> str:
     except Exception as e:
         print(f"❌ Error reading categories.csv from S3: {e}")
 
-    if not existing.empty:
-        existing["_key"] = _composite_key(existing)
-    uniques["_key"] = _composite_key(uniques)
-
+    # existing goes first (labeled rows ahead of blank ones) so keep="first" preserves
+    # its ai_category values
+    cols = ["facility","address","city","ai_category"]
     if existing.empty:
-        combined = uniques.copy()
+        combined = uniques[cols]
     else:
-        new_rows = uniques.loc[~uniques["_key"].isin(existing["_key"]), :]
-        missing_cols = [c for c in ["facility","address","city","ai_category","_key"] if c not in new_rows.columns]
-        for c in missing_cols:
-            new_rows[c] = "" if c != "_key" else new_rows["_key"]
-        combined = pd.concat([existing, new_rows[existing.columns]], ignore_index=True)
-
-    if "_key" in combined.columns:
-        combined.drop(columns=["_key"], inplace=True)
-
-    combined = combined[["facility","address","city","ai_category"]].drop_duplicates().sort_values(
+        labeled = existing["ai_category"].ne("")
+        combined = pd.concat([existing.loc[labeled, cols], existing.loc[~labeled, cols], uniques[cols]], ignore_index=True)
+        for col in ["facility","address","city"]:
+            combined[col] = combined[col].astype("category")
+    combined = combined.drop_duplicates(subset=["facility","address","city"], keep="first").sort_values(
         ["facility","address","city"]
-    ).reset_index(drop=True)
+    ).reset_index(drop=True).astype(object)
 
     os.makedirs("data", exist_ok=True)
     local_path = "data/categories.csv"
-    combined.to_csv(local_path, index=False)
+    data = combined.to_csv(index=False).encode("utf-8")
+    with open(local_path, "wb") as f:
+        f.write(data)
     print(f"📝 Wrote local categories.csv with {len(combined)} unique rows.")
 
     try:
         s3_client.put_object(
             Bucket=S3_BUCKET_NAME,
             Key=S3_KEY,
-            Body=combined.to_csv(index=False),
+            Body=data,
         )
         print(f"✅ Upserted categories.csv to s3://{S3_BUCKET_NAME}/{S3_KEY}")
     except Exception as e:
@@ -113,7 +123,7 @@ def upsert_categories(local_inspections_file: str) -> str:
 
 def join_categories_into_inspections(local_inspections_file: str) -> bool:
     try:
-        df = pd.read_excel(local_inspections_file, dtype=str)
+        df, remote = _read_with_s3_prefetch(local_inspections_file)
     except Exception as e:
         print(f"❌ Could not read {local_inspections_file}: {e}")
         return False
@@ -133,14 +143,8 @@ def join_categories_into_inspections(local_inspections_file: str) -> bool:
     categories = None
     if AWS_ACCESS_KEY and AWS_SECRET_KEY and S3_BUCKET_NAME and AWS_REGION:
         try:
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=AWS_ACCESS_KEY,
-                aws_secret_access_key=AWS_SECRET_KEY,
-                region_name=AWS_REGION,
-            )
-            s3_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=S3_KEY)
-            categories = pd.read_csv(io.BytesIO(s3_obj["Body"].read()), dtype=str)
+            s3_client = _get_s3_client()
+            categories = remote.result() if remote else _read_s3_categories()
             print("✅ Loaded categories.csv from S3 for exact-match join.")
         except s3_client.exceptions.NoSuchKey:
             print("ℹ️ categories.csv not found in S3; will look for local fallback.")
@@ -149,7 +153,7 @@ def join_categories_into_inspections(local_inspections_file: str) -> bool:
 
     if categories is None and os.path.exists("data/categories.csv"):
         try:
-            categories = pd.read_csv("data/categories.csv", dtype=str)
+            categories = read_csv_str("data/categories.csv")
             print("ℹ️ Loaded local categories.csv for exact-match join.")
         except Exception as e:
             print(f"❌ Error reading local categories.csv: {e}")
@@ -163,7 +167,7 @@ def join_categories_into_inspections(local_inspections_file: str) -> bool:
             for legacy in ["category","cuisine","ai_confidence","ai_rationale"]:
                 if legacy in df.columns:
                     df.drop(columns=[legacy], inplace=True)
-            df.to_excel(local_inspections_file, index=False)
+            write_excel(df, local_inspections_file)
             print("📝 Wrote inspections with empty 'ai_category' column (no categories.csv available).")
             return True
         except Exception as e:
@@ -175,11 +179,12 @@ def join_categories_into_inspections(local_inspections_file: str) -> bool:
             categories[col] = ""
         categories[col] = categories[col].fillna("").astype(str).str.strip()
 
-    categories = categories[["facility","address","city","ai_category"]].drop_duplicates()
+    # One row per key; the last one wins, as it would when building a lookup dict
+    categories = categories[["facility","address","city","ai_category"]].drop_duplicates(
+        ["facility","address","city"], keep="last"
+    )
 
-    keys = list(zip(df["facility"], df["address"], df["city"]))
-    m = dict(zip(zip(categories["facility"], categories["address"], categories["city"]), categories["ai_category"]))
-    ai_vals = [m.get(k, "") for k in keys]
+    ai_vals = df[needed].merge(categories, on=needed, how="left")["ai_category"].fillna("").to_numpy()
 
     if "ai_category" in df.columns:
         df["ai_category"] = ai_vals
@@ -192,7 +197,7 @@ def join_categories_into_inspections(local_inspections_file: str) -> bool:
             df.drop(columns=[legacy], inplace=True)
 
     try:
-        df.to_excel(local_inspections_file, index=False)
+        write_excel(df, local_inspections_file)
         print("✅ Wrote inspections.xlsx with only 'ai_category' injected.")
         return True
     except Exception as e:
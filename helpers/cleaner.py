@@ -1,25 +1,107 @@
+import calendar
 import pandas as pd
 import re
 from helpers.dictionaries.ap_months import AP_MONTHS
 from helpers.dictionaries.ap_addresses import AP_STREET_ABBREVIATIONS
 from helpers.dictionaries.title_case import TITLE_CASE
-
-def fix_ordinal_suffixes(text):
-    if not isinstance(text, str):
-        return text
-    
-    pattern = r'(\d+)(ST|ND|RD|TH)\b'
-    
-    def replace_and_log(match):
-        return match.group(1) + match.group(2).lower()
-    
-    result = re.sub(pattern, replace_and_log, text, flags=re.IGNORECASE)
-    return result
-
-def clean_data(file_path):
+from helpers.workbook_cache import write_excel, write_snapshot
+
+# Facility-name fixes shared by both cleaners, folded into one alternation so the column
+# is rewritten once: apostrophes, possessives ("Joe'S" -> "Joe's") and LLC/DBA
+_FACILITY_FIXES = (
+    r"(?P<poss>(?<=\w)[`´']S\b)"
+    r"|(?P<apos>[`´'])"
+    r"|(?P<llc>\bLlc\b)"
+    r"|(?P<dba>\bDba\b)"
+)
+FACILITY_RE = re.compile(_FACILITY_FIXES)
+
+def facility_sub(match):
+    kind = match.lastgroup
+    if kind == "poss":
+        return "'s"
+    if kind == "apos":
+        return "'"
+    if kind == "ord":
+        return match.group().lower()
+    return match.group().upper()
+
+# Address fixes: AP compass points ("N" -> "N."), " Pa " -> ", PA ", hidden line breaks,
+# and doubled periods/commas
+COMPASS_RE = re.compile(r"\b(N|S|E|W|NE|NW|SE|SW)\b")
+PA_RE = re.compile(r"(\s)Pa(\s)")
+LINE_BREAK_RE = re.compile(r"\s*\n\s*")
+DOUBLE_PERIOD_RE = re.compile(r"\.{2,}")
+DOUBLE_COMMA_RE = re.compile(r",\s*,+")
+
+# City: the comma-free segment just before the ", PA " state marker
+CITY_RE = re.compile(r",\s*([^,]+)\s*,\s*PA\s")
+
+# All street types in one alternation, longest first so "Avenue" wins over "Ave"
+STREET_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in sorted(AP_STREET_ABBREVIATIONS, key=len, reverse=True)) + r")\b"
+)
+
+def street_sub(match):
+    return AP_STREET_ABBREVIATIONS[match.group(1)]
+
+# clean_data's full facility pass after title-casing: small words lowercased anywhere but
+# the first word, whitespace runs collapsed to one space (what the old split()/join() did),
+# ordinal suffixes after numbers lowercased, and the FACILITY_RE fixes. None of these can
+# create or hide a match for another, so one scan gives the same result as running them in sequence.
+FACILITY_NAME_RE = re.compile(
+    r"(?P<ws>[^\S ]\s*| \s+)"
+    r"|(?<=\s)(?P<word>(?i:" + "|".join(sorted(TITLE_CASE, key=len, reverse=True)) + r"))(?=\s|$)"
+    r"|(?P<ord>(?<=\d)(?i:st|nd|rd|th)\b)"
+    r"|" + _FACILITY_FIXES
+)
+
+def facility_name_sub(match):
+    if match.lastgroup == "ws":
+        return " "
+    if match.lastgroup == "word":
+        return match.group("word").lower()
+    return facility_sub(match)
+
+# Ordinal suffixes after a number ("2ND" -> "2nd")
+ORDINAL_RE = re.compile(r"(?<=\d)(?:st|nd|rd|th)\b", re.IGNORECASE)
+
+def lower_match(match):
+    return match.group(0).lower()
+
+# AP month names by month number
+AP_MONTH_BY_NUMBER = pd.Series({m: AP_MONTHS[calendar.month_name[m]] for m in range(1, 13)})
+
+def unique_values(col):
+    # col's distinct values (all missing cells as one NaN) and each row's position among them
+    codes, uniques = pd.factorize(col, use_na_sentinel=False)
+    return codes, pd.Series(uniques)
+
+def ap_date(dates):
+    # "Jan. 5, 2025" built from the month/day/year parts; same as strftime('%B %-d, %Y')
+    # followed by the AP month rewrite. NaT stays missing. Each distinct date is formatted once.
+    codes, uniques = unique_values(dates)
+    valid = uniques.dropna()
+    formatted = (
+        valid.dt.month.map(AP_MONTH_BY_NUMBER) + " " + valid.dt.day.astype(str) + ", " + valid.dt.year.astype(str)
+    )
+    return pd.Series(formatted.reindex(uniques.index).to_numpy()[codes], index=dates.index, dtype=object)
+
+def on_strings(col, transform):
+    # Run a .str transform over the text cells only. .str turns numbers/dates into NaN (and only
+    # accepts columns holding some text), so those cells are handed back untouched.
+    if pd.api.types.infer_dtype(col, skipna=True) not in ("string", "mixed", "mixed-integer"):
+        return col
+    out = transform(col)
+    return out.where(out.notna(), col)
+
+def strip_strings(col):
+    return on_strings(col, lambda c: c.str.strip())
+
+def clean_data(file_path, snapshot=True):
     try:
         # Read the Excel file
-        df = pd.read_excel(file_path)
+        df = pd.read_excel(file_path, engine="calamine")
 
         # Remove the first two rows
         df = df.iloc[2:].reset_index(drop=True)
@@ -43,130 +125,79 @@ def clean_data(file_path):
             print(f"Warning: Column count mismatch. Expected {len(new_column_names)}, but got {len(df.columns)}.")
 
         # Trim whitespace in every string cell
-        df = df.apply(lambda col: col.map(lambda x: x.strip() if isinstance(x, str) else x))
+        for col in df.select_dtypes(include="object").columns:
+            df[col] = strip_strings(df[col])
+
+        # Facility and address values repeat across inspections, so each distinct value is
+        # cleaned once and the results are spread back onto the rows
+        facility_codes, facility = unique_values(df["facility"])
+        address_codes, address = unique_values(df["address"])
 
         # Convert to title case
-        df["facility"] = df["facility"].apply(lambda x: x.title() if isinstance(x, str) else x)
-        
-        # Fix ordinal suffixes after numbers
-        print("Fixing ordinal suffixes in facility names...")
-        df["facility"] = df["facility"].apply(fix_ordinal_suffixes)
-
-        # Correct small words in facility names
-        df["facility"] = df["facility"].apply(lambda x: ' '.join(
-            [word if i == 0 or word.lower() not in TITLE_CASE else word.lower() 
-             for i, word in enumerate(x.split())]) if isinstance(x, str) else x
-        )
-
-        # Normalize apostrophes (replace backticks and other variations with a standard apostrophe)
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r"[`´'']", "'", x) if isinstance(x, str) else x
-        )
-
-        # Fix possessive capitalization (e.g., "Joe'S" to "Joe's")
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r"(\b\w+)'S\b", lambda m: f"{m.group(1)}'s", x) if isinstance(x, str) else x
-        )
-
-        # Replace "Llc" with "LLC"
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r'\bLlc\b', 'LLC', x) if isinstance(x, str) else x
-        )
-
-        # Replace "Dba" with "DBA"
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r'\bDba\b', 'DBA', x) if isinstance(x, str) else x
-        )
+        facility = on_strings(facility, lambda c: c.str.title())
+
+        # Correct small words, normalize apostrophes, fix possessives ("Joe'S" to "Joe's"),
+        # lowercase ordinal suffixes after numbers, and uppercase "Llc"/"Dba" in a single pass
+        facility = on_strings(facility, lambda c: c.str.replace(FACILITY_NAME_RE, facility_name_sub, regex=True))
 
         # Convert address to title case
-        df["address"] = df["address"].apply(lambda x: x.title() if isinstance(x, str) else x)
+        address = on_strings(address, lambda c: c.str.title())
 
         # Replace compass directions with AP style
-        df["address"] = df["address"].apply(
-            lambda x: re.sub(r"\b(N|S|E|W|NE|NW|SE|SW)\b", r"\1.", x) if isinstance(x, str) else x
-        )
+        address = on_strings(address, lambda c: c.str.replace(COMPASS_RE, r"\1.", regex=True))
         
         # Replace " Pa " with ", PA " in address
-        df["address"] = df["address"].apply(
-            lambda x: re.sub(r'(\s)Pa(\s)', r', PA\2', x) if isinstance(x, str) else x
-        )
+        address = on_strings(address, lambda c: c.str.replace(PA_RE, r', PA\2', regex=True))
 
         # Replace hidden line breaks with commas in address
-        df["address"] = df["address"].astype(str).str.replace(r'\s*\n\s*', ', ', regex=True)
-
-        # Convert inspection_date to datetime
-        df['inspection_date'] = pd.to_datetime(df['inspection_date'], errors='coerce')
-
-        # Sort by descending
-        df = df.sort_values(by='inspection_date', ascending=False)
-
-        # Format the date
-        df['inspection_date'] = df['inspection_date'].dt.strftime('%B %-d, %Y')
-
-         # Replace months with AP Style abbreviations
-        df["inspection_date"] = df["inspection_date"].apply(
-            lambda x: re.sub(r"(" + "|".join(AP_MONTHS.keys()) + r")", lambda m: AP_MONTHS[m.group()], x) if pd.notna(x) else x
-        )
+        address = address.astype(str).str.replace(LINE_BREAK_RE, ', ', regex=True)
 
         # Replace streets with AP Style abbreviations
-        def replace_street_type(address):
-            if isinstance(address, str):
-                for full, abbr in AP_STREET_ABBREVIATIONS.items():
-                    address = re.sub(rf"\b{full}\b", abbr, address)
-            return address
-
-        df["address"] = df["address"].apply(replace_street_type)
+        address = address.str.replace(STREET_RE, street_sub, regex=True)
 
         # Extract city using ", PA " as boundary
-        def extract_city(address):
-            if isinstance(address, str):
-                match = re.search(r",\s*([^,]+)\s*,\s*PA\s", address)
-                if match:
-                    return match.group(1).strip()
-            return ""
-
-        # Insert 'city' column right after 'address'
-        df.insert(df.columns.get_loc("address") + 1, "city", df["address"].apply(extract_city))
+        city = address.str.extract(CITY_RE, expand=False).fillna("").str.strip()
 
         # Fix ordinal suffixes to be lowercase when following a number
-        df["address"] = df["address"].apply(lambda x: re.sub(r"(?<=\d)(ST|ND|RD|TH)\b", lambda m: m.group(0).lower(), x, flags=re.IGNORECASE) if isinstance(x, str) else x)
+        address = address.str.replace(ORDINAL_RE, lower_match, regex=True)
 
         # Replace all instances of double periods with a single period
-        df["address"] = df["address"].apply(lambda x: re.sub(r"\.{2,}", ".", x) if isinstance(x, str) else x)
+        address = address.str.replace(DOUBLE_PERIOD_RE, ".", regex=True)
 
         # Replace all instances of double commas with a single comma
-        df["address"] = df["address"].apply(lambda x: re.sub(r",\s*,+", ", ", x) if isinstance(x, str) else x)
-
-        # Single inspections with multiple violations
-        def combine_violations(group):
-            # For fields that should be the same, take the first value
-            result = group.iloc[0].copy()
-            
-            # Combine violation codes
-            violation_codes = group['violation_code'].dropna().astype(str)
-            if len(violation_codes) > 0:
-                result['violation_code'] = ' | '.join(violation_codes)
-            
-            # Combine violation descriptions
-            violation_descs = group['violation_description'].dropna().astype(str)
-            if len(violation_descs) > 0:
-                result['violation_description'] = ' | '.join(violation_descs)
-            
-            # Combine comments
-            comments = group['comment'].dropna().astype(str)
-            if len(comments) > 0:
-                result['comment'] = ' | '.join(comments)
-            
-            return result
-        
-        # Group by facility, address, and inspection_date
-        df = df.groupby(['facility', 'address', 'inspection_date'], as_index=False, dropna=False).apply(combine_violations)
-        df = df.reset_index(drop=True)
-        
+        address = address.str.replace(DOUBLE_COMMA_RE, ", ", regex=True)
+
+        df["facility"] = facility.to_numpy()[facility_codes]
+        df["address"] = address.to_numpy()[address_codes]
+        # Insert city right after 'address'
+        df.insert(df.columns.get_loc("address") + 1, "city", city.to_numpy()[address_codes])
+
+        # Convert inspection_date to datetime
+        df['inspection_date'] = pd.to_datetime(df['inspection_date'], errors='coerce')
+
+        # Sort by descending
+        df = df.sort_values(by='inspection_date', ascending=False)
+
+        # Format the date with AP Style month abbreviations
+        df['inspection_date'] = ap_date(df['inspection_date'])
+
+        # Single inspections with multiple violations: keep the first row of each
+        # facility/address/inspection_date group and join its violation fields
+        group_ids = df.groupby(['facility', 'address', 'inspection_date'], dropna=False, sort=False).ngroup()
+        combined = df[~group_ids.duplicated()].copy()
+        for col in ['violation_code', 'violation_description', 'comment']:
+            values = df[col].dropna().astype(str)
+            joined = values.groupby(group_ids[values.index]).agg(' | '.join)
+            combined[col] = group_ids[combined.index].map(joined)
+        df = combined.reset_index(drop=True)
 
         # Save the cleaned data
-        df.to_excel(file_path, index=False)
+        write_excel(df, file_path)
+        # Callers that rewrite the file straight away skip the parquet copy
+        if snapshot:
+            write_snapshot(df, file_path)
 
         print(f"Cleaned data saved as: {file_path}")
+        return df
     except Exception as e:
         print(f"Data cleaning failed: {e}")
\ No newline at end of file
@@ -0,0 +1,52 @@
+import io
+import csv
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+def _dedup_names(names):
+    # Repeated headers get ".1", ".2", ... suffixes (skipping ones already taken), as pandas' reader does
+    taken = set(names)
+    counts = {}
+    deduped = []
+    for name in names:
+        count = counts.get(name, 0)
+        new_name = name
+        while count > 0:
+            counts[name] = count + 1
+            new_name = f"{name}.{count}"
+            count = count + 1 if new_name in taken else counts.get(new_name, 0)
+        deduped.append(new_name)
+        counts[new_name] = count + 1
+    return deduped
+
+def read_csv_str(src) -> pd.DataFrame:
+    """
+    pd.read_csv(src, dtype=str) through pyarrow's multithreaded CSV reader.
+    src is a path or a readable binary stream (e.g. an S3 StreamingBody).
+
+    Every column is declared as string before parsing; pandas' engine="pyarrow" infers
+    types first and casts afterwards, which turns "1" into "1.0" and blanks into "nan".
+    Blank and NA-like cells come back as missing, as with the default reader, and
+    repeated headers are renamed "a", "a.1", ... An empty file gives an empty frame.
+    """
+    if hasattr(src, "read"):
+        data = src.read()
+    else:
+        with open(src, "rb") as f:
+            data = f.read()
+    header = next(csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")), None)
+    if header is None:
+        return pd.DataFrame()
+    names = _dedup_names(header)
+    table = pacsv.read_csv(
+        pa.BufferReader(data),
+        read_options=pacsv.ReadOptions(column_names=names, skip_rows=1),
+        # Quoted values may span lines; without this a quoted newline past the first block fails to parse
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types={n: pa.string() for n in names},
+            strings_can_be_null=True,
+        ),
+    )
+    return table.to_pandas()
@@ -1,12 +1,14 @@
 import pandas as pd
-import re
-from helpers.dictionaries.ap_months import AP_MONTHS
-from helpers.dictionaries.ap_addresses import AP_STREET_ABBREVIATIONS
+from helpers.cleaner import (
+    strip_strings, on_strings, FACILITY_RE, facility_sub, STREET_RE, street_sub, ORDINAL_RE, lower_match, ap_date, unique_values,
+    COMPASS_RE, PA_RE, LINE_BREAK_RE, DOUBLE_PERIOD_RE, DOUBLE_COMMA_RE, CITY_RE,
+)
+from helpers.workbook_cache import write_excel
 
 
 def clean_facilities(file_path):
     try:
-        df = pd.read_excel(file_path, header=2)
+        df = pd.read_excel(file_path, header=2, engine="calamine")
 
         # Rename columns to match expected names
         new_column_names = [
@@ -26,66 +28,41 @@ def clean_facilities(file_path):
             print(f"Warning: Column count mismatch. Expected {len(new_column_names)}, got {len(df.columns)}: {list(df.columns)}")
 
         # Trim whitespace
-        df = df.apply(lambda col: col.map(lambda x: x.strip() if isinstance(x, str) else x))
+        for col in df.select_dtypes(include="object").columns:
+            df[col] = strip_strings(df[col])
 
-        # Facility cleaning
-        df["facility"] = df["facility"].apply(lambda x: x.title() if isinstance(x, str) else x)
+        # Each distinct facility/address is cleaned once and spread back onto the rows
+        facility_codes, facility = unique_values(df["facility"])
+        address_codes, address = unique_values(df["address"])
 
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r"[`´'']", "'", x) if isinstance(x, str) else x
-        )
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r"(\b\w+)'S\b", lambda m: f"{m.group(1)}'s", x) if isinstance(x, str) else x
-        )
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r'\bLlc\b', 'LLC', x) if isinstance(x, str) else x
-        )
-        df["facility"] = df["facility"].apply(
-            lambda x: re.sub(r'\bDba\b', 'DBA', x) if isinstance(x, str) else x
-        )
+        # Facility cleaning
+        facility = on_strings(facility, lambda c: c.str.title())
+        facility = on_strings(facility, lambda c: c.str.replace(FACILITY_RE, facility_sub, regex=True))
 
         # Address cleaning
-        df["address"] = df["address"].astype(str).str.replace(r'\s*\n\s*', ', ', regex=True)
-        df["address"] = df["address"].apply(lambda x: x.title() if isinstance(x, str) else x)
-        df["address"] = df["address"].apply(
-            lambda x: re.sub(r"\b(N|S|E|W|NE|NW|SE|SW)\b", r"\1.", x) if isinstance(x, str) else x
-        )
-        df["address"] = df["address"].apply(
-            lambda x: re.sub(r'(\s)Pa(\s)', r', PA\2', x) if isinstance(x, str) else x
-        )
-
-        def replace_street_type(address):
-            if isinstance(address, str):
-                for full, abbr in AP_STREET_ABBREVIATIONS.items():
-                    address = re.sub(rf"\b{full}\b", abbr, address)
-            return address
+        address = address.astype(str).str.replace(LINE_BREAK_RE, ', ', regex=True)
+        address = address.str.title()
+        address = address.str.replace(COMPASS_RE, r"\1.", regex=True)
+        address = address.str.replace(PA_RE, r', PA\2', regex=True)
 
-        df["address"] = df["address"].apply(replace_street_type)
-        df["address"] = df["address"].apply(
-            lambda x: re.sub(r"(?<=\d)(ST|ND|RD|TH)\b", lambda m: m.group(0).lower(), x, flags=re.IGNORECASE) if isinstance(x, str) else x
-        )
-        df["address"] = df["address"].apply(lambda x: re.sub(r"\.{2,}", ".", x) if isinstance(x, str) else x)
-        df["address"] = df["address"].apply(lambda x: re.sub(r",\s*,+", ", ", x) if isinstance(x, str) else x)
+        address = address.str.replace(STREET_RE, street_sub, regex=True)
+        address = address.str.replace(ORDINAL_RE, lower_match, regex=True)
+        address = address.str.replace(DOUBLE_PERIOD_RE, ".", regex=True)
+        address = address.str.replace(DOUBLE_COMMA_RE, ", ", regex=True)
 
         # --- City extraction ---
-        def extract_city(address):
-            if isinstance(address, str):
-                match = re.search(r",\s*([^,]+)\s*,\s*PA\s", address)
-                if match:
-                    return match.group(1).strip()
-            return ""
+        city = address.str.extract(CITY_RE, expand=False).fillna("").str.strip()
 
-        df.insert(df.columns.get_loc("address") + 1, "city", df["address"].apply(extract_city))
+        df["facility"] = facility.to_numpy()[facility_codes]
+        df["address"] = address.to_numpy()[address_codes]
+        df.insert(df.columns.get_loc("address") + 1, "city", city.to_numpy()[address_codes])
 
         # Date cleaning
         df["last_inspection_date"] = pd.to_datetime(df["last_inspection_date"], errors="coerce")
         df = df.sort_values(by="last_inspection_date", ascending=False)
-        df["last_inspection_date"] = df["last_inspection_date"].dt.strftime("%B %-d, %Y")
-        df["last_inspection_date"] = df["last_inspection_date"].apply(
-            lambda x: re.sub(r"(" + "|".join(AP_MONTHS.keys()) + r")", lambda m: AP_MONTHS[m.group()], x) if pd.notna(x) else x
-        )
+        df["last_inspection_date"] = ap_date(df["last_inspection_date"])
 
-        df.to_excel(file_path, index=False)
+        write_excel(df, file_path)
         print(f"Cleaned facilities data saved as: {file_path}")
 
     except Exception as e:
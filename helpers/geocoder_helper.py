@@ -1,14 +1,110 @@
 import os
 import io
-import boto3
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+from helpers._s3 import get_s3_client
+from helpers.csv_helper import read_csv_str
+from helpers.workbook_cache import read_excel_str, write_excel, write_snapshot
 from geocodio import GeocodioClient
 
+ADDRESSES_S3_KEY = "2025/restaurant-inspections/addresses.parquet"
+LEGACY_ADDRESSES_S3_KEY = "2025/restaurant-inspections/addresses.csv"
+GEOCODE_CACHE_S3_KEY = "2025/restaurant-inspections/geocode_cache.parquet"
+GEOCODIO_BATCH_SIZE = 1000
+GEOCODIO_MAX_WORKERS = 16
+
+def load_addresses(s3_client, bucket):
+    """
+    Saved Address/Latitude/Longitude rows from S3, with float coordinates, or None on failure.
+    Reads addresses.parquet, falling back to the legacy addresses.csv if it hasn't been written yet.
+    """
+    try:
+        s3_obj = s3_client.get_object(Bucket=bucket, Key=ADDRESSES_S3_KEY)
+        addresses_df = pd.read_parquet(io.BytesIO(s3_obj["Body"].read()))
+        print("✅ 'addresses.parquet' downloaded from S3 and loaded successfully.")
+    except s3_client.exceptions.NoSuchKey:
+        try:
+            s3_obj = s3_client.get_object(Bucket=bucket, Key=LEGACY_ADDRESSES_S3_KEY)
+            addresses_df = read_csv_str(s3_obj["Body"])
+            print("✅ 'addresses.csv' downloaded from S3 and loaded successfully.")
+        except s3_client.exceptions.NoSuchKey:
+            print(f"❌ Neither 'addresses.parquet' nor 'addresses.csv' found in s3://{bucket}/")
+            return None
+        except Exception as e:
+            print(f"❌ Error retrieving 'addresses.csv' from S3: {e}")
+            return None
+    except Exception as e:
+        print(f"❌ Error retrieving 'addresses.parquet' from S3: {e}")
+        return None
+
+    # Make sure DataFrame columns match the expected names
+    expected_cols = {"Address", "Latitude", "Longitude"}
+    if not expected_cols.issubset(set(addresses_df.columns)):
+        print(f"❌ The saved addresses must contain at least these columns: {expected_cols}")
+        return None
+
+    # Blank addresses come back as None; make them NaN so drop_duplicates matches the
+    # NaN addresses appended from inspections
+    addresses_df["Address"] = addresses_df["Address"].where(addresses_df["Address"].notna())
+
+    # Convert lat/long columns to numeric (already float64 when read from parquet)
+    addresses_df["Latitude"] = pd.to_numeric(addresses_df["Latitude"], errors="coerce")
+    addresses_df["Longitude"] = pd.to_numeric(addresses_df["Longitude"], errors="coerce")
+    return addresses_df
+
+def normalize_address(address) -> str:
+    # Cache key: lowercased, with runs of whitespace collapsed
+    return " ".join(str(address).split()).lower()
+
+def result_location(result):
+    """(lat, lng) of the top match in one Geocodio result, or None if there isn't one."""
+    # Batch responses wrap each result as {"query": ..., "response": {"results": [...]}}
+    result = result.get("response", result)
+    if "results" in result and result["results"]:
+        location = result["results"][0]["location"]
+        return (location.get("lat"), location.get("lng"))
+    return None
+
+def safe_geocode(client, address_str):
+    """Geocode a single address, returning (lat, lng) or None on no match or error."""
+    try:
+        return result_location(client.geocode(address_str))
+    except Exception as e:
+        print(f"❌ Error geocoding '{address_str}': {e}")
+        return None
+
+def load_geocode_cache(s3_client, bucket) -> dict:
+    """Fetch the normalized address -> (lat, lng) cache of past Geocodio hits from S3."""
+    try:
+        s3_obj = s3_client.get_object(Bucket=bucket, Key=GEOCODE_CACHE_S3_KEY)
+        cache_df = pd.read_parquet(io.BytesIO(s3_obj["Body"].read()))
+        cache = dict(zip(cache_df["address"], zip(cache_df["Latitude"], cache_df["Longitude"])))
+        print(f"✅ Loaded geocode cache with {len(cache)} addresses.")
+        return cache
+    except s3_client.exceptions.NoSuchKey:
+        print("ℹ️ No geocode cache in S3 yet; starting a new one.")
+    except Exception as e:
+        print(f"❌ Error loading geocode cache from S3: {e}")
+    return {}
+
+def save_geocode_cache(s3_client, bucket, cache: dict) -> None:
+    cache_df = pd.DataFrame.from_records(
+        [(address, lat, lng) for address, (lat, lng) in cache.items()],
+        columns=["address", "Latitude", "Longitude"]
+    )
+    buf = io.BytesIO()
+    cache_df.to_parquet(buf, index=False)
+    try:
+        s3_client.put_object(Bucket=bucket, Key=GEOCODE_CACHE_S3_KEY, Body=buf.getvalue())
+        print(f"✅ Geocode cache ({len(cache)} addresses) uploaded to S3.")
+    except Exception as e:
+        print(f"❌ Error uploading geocode cache to S3: {e}")
+
 def geocode(local_inspections_file):
 
     # Load inspections.xlsx
     try:
-        inspections_df = pd.read_excel(local_inspections_file, dtype=str)
+        inspections_df = read_excel_str(local_inspections_file)
         print(f"✅ Loaded local inspections file: {local_inspections_file}")
     except FileNotFoundError:
         print(f"❌ Could not find local file: {local_inspections_file}")
@@ -17,55 +113,28 @@ def geocode(local_inspections_file):
         print(f"❌ Error reading {local_inspections_file}: {e}")
         return
 
-    # Download addresses.csv from S3
+    # Download saved addresses from S3
     AWS_ACCESS_KEY = os.getenv("AWS_ACCESS_KEY_ID")
     AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
     S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
     AWS_REGION = os.getenv("AWS_REGION")
 
-    s3_client = boto3.client(
-        "s3",
-        aws_access_key_id=AWS_ACCESS_KEY,
-        aws_secret_access_key=AWS_SECRET_KEY,
-        region_name=AWS_REGION
-    )
-
-    # Construct the S3 key for addresses.csv
-    addresses_s3_key = "2025/restaurant-inspections/addresses.csv"
+    s3_client = get_s3_client()
 
-    try:
-        s3_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=addresses_s3_key)
-        addresses_df = pd.read_csv(io.BytesIO(s3_obj["Body"].read()), dtype=str)
-        print("✅ 'addresses.csv' downloaded from S3 and loaded successfully.")
-    except s3_client.exceptions.NoSuchKey:
-        print(f"❌ 'addresses.csv' not found at s3://{S3_BUCKET_NAME}/{addresses_s3_key}")
-        return
-    except Exception as e:
-        print(f"❌ Error retrieving 'addresses.csv' from S3: {e}")
-        return
-
-    # Make sure DataFrame columns match the expected names
-    expected_cols = {"Address", "Latitude", "Longitude"}
-    if not expected_cols.issubset(set(addresses_df.columns)):
-        print(f"❌ 'addresses.csv' must contain at least these columns: {expected_cols}")
+    # addresses.parquet supersedes addresses.csv; the CSV is only read until the first upload
+    addresses_df = load_addresses(s3_client, S3_BUCKET_NAME)
+    if addresses_df is None:
         return
 
-    # Convert lat/long columns to numeric
-    addresses_df["Latitude"] = pd.to_numeric(addresses_df["Latitude"], errors="coerce")
-    addresses_df["Longitude"] = pd.to_numeric(addresses_df["Longitude"], errors="coerce")
-
-    # Merge addresses with inspections
+    # Merge addresses with inspections, joining on shared integer codes for the address
+    # strings rather than hashing the strings themselves; blanks share code -1 and still match
+    address_keys, _ = pd.factorize(pd.concat([inspections_df["address"], addresses_df["Address"]], ignore_index=True))
     merged_df = pd.merge(
-        inspections_df,
-        addresses_df,
+        inspections_df.assign(_address_key=address_keys[:len(inspections_df)]),
+        addresses_df.drop(columns=["Address"]).assign(_address_key=address_keys[len(inspections_df):]),
         how="left",
-        left_on="address",
-        right_on="Address"
-    )
-
-    # Remove the redundant 'Address' column from addresses.csv
-    if "Address" in merged_df.columns:
-        merged_df.drop(columns=["Address"], inplace=True)
+        on="_address_key"
+    ).drop(columns=["_address_key"])
 
     # Reorder columns
     desired_order = [
@@ -87,10 +156,13 @@ def geocode(local_inspections_file):
     # Drop all columns except 'address', remove duplicates and save
     if not missing_addresses_df.empty:
         missing_addresses_df = missing_addresses_df[["address"]].drop_duplicates()
-        os.makedirs("data", exist_ok=True)
+        # data/missing_addresses.csv is only for inspecting a run by hand
+        write_missing = os.getenv("DEBUG_WRITE_MISSING", "false").lower() == "true"
         missing_file = "data/missing_addresses.csv"
-        missing_addresses_df.to_csv(missing_file, index=False)
-        print(f"✅ Missing addresses saved to: {missing_file}")
+        if write_missing:
+            os.makedirs("data", exist_ok=True)
+            missing_addresses_df.to_csv(missing_file, index=False)
+            print(f"✅ Missing addresses saved to: {missing_file}")
 
         # Geocode missing addresses with Geocodio and overwrite file
         geocodio_api_key = os.getenv("GEOCODIO_API_KEY")
@@ -100,40 +172,64 @@ def geocode(local_inspections_file):
 
         client = GeocodioClient(geocodio_api_key)
 
-        # Add columns for lat/long to store results
-        missing_addresses_df["Latitude"] = None
-        missing_addresses_df["Longitude"] = None
+        # Only call Geocodio for addresses we haven't already resolved on an earlier run
+        cache = load_geocode_cache(s3_client, S3_BUCKET_NAME)
+        coords = {}
+        cache_hits = 0
+        new_hits = 0
 
-        for idx, row in missing_addresses_df.iterrows():
-            address_str = row["address"]
+        uncached = []
+        for address_str in missing_addresses_df["address"]:
+            cache_key = normalize_address(address_str)
+            if cache_key in cache:
+                coords[address_str] = cache[cache_key]
+                cache_hits += 1
+            elif pd.notna(address_str):
+                uncached.append(address_str)
+
+        # Geocode the rest with Geocodio's batch endpoint, one request per chunk
+        for start in range(0, len(uncached), GEOCODIO_BATCH_SIZE):
+            chunk = uncached[start:start + GEOCODIO_BATCH_SIZE]
             try:
-                response = client.geocode(address_str)
-                result = response  # No need for .json()
+                locations = [result_location(result) for result in client.geocode(chunk)]
+            except Exception as e:
+                # Fall back to one request per address, several in flight at once
+                print(f"❌ Error batch geocoding {len(chunk)} addresses ({e}); geocoding them one by one.")
+                with ThreadPoolExecutor(max_workers=GEOCODIO_MAX_WORKERS) as executor:
+                    locations = list(executor.map(lambda a: safe_geocode(client, a), chunk))
 
-                if "results" in result and result["results"]:
-                    location = result["results"][0]["location"]
-                    missing_addresses_df.at[idx, "Latitude"] = location.get("lat")
-                    missing_addresses_df.at[idx, "Longitude"] = location.get("lng")
+            for address_str, location in zip(chunk, locations):
+                if location is None:
+                    print(f"❌ No Geocodio match for '{address_str}'")
+                    continue
+                coords[address_str] = location
+                if None not in location:
+                    cache[normalize_address(address_str)] = location
+                    new_hits += 1
 
-            except Exception as e:
-                print(f"❌ Error geocoding '{address_str}': {e}")
+        print(f"✅ {cache_hits} addresses served from the geocode cache, {new_hits} newly geocoded.")
+        if new_hits:
+            save_geocode_cache(s3_client, S3_BUCKET_NAME, cache)
+
+        # Add columns for lat/long to store results
+        missing_addresses_df["Latitude"] = missing_addresses_df["address"].map(lambda a: coords.get(a, (None, None))[0])
+        missing_addresses_df["Longitude"] = missing_addresses_df["address"].map(lambda a: coords.get(a, (None, None))[1])
 
 
         # Overwrite missing_addresses.csv with new columns
-        missing_addresses_df.to_csv(missing_file, index=False)
-        print(f"✅ Missing addresses updated with coordinates in: {missing_file}")
-
-        # Merge geocoded addresses back into merged_df
-        merged_df = merged_df.merge(
-            missing_addresses_df, on="address", how="left", suffixes=("", "_geocoded")
-        )
-        merged_df["Latitude"] = pd.to_numeric(
-            merged_df["Latitude"].fillna(merged_df["Latitude_geocoded"]), errors="coerce"
-        )
-        merged_df["Longitude"] = pd.to_numeric(
-            merged_df["Longitude"].fillna(merged_df["Longitude_geocoded"]), errors="coerce"
-        )
-        merged_df.drop(columns=["Latitude_geocoded", "Longitude_geocoded"], inplace=True)
+        if write_missing:
+            missing_addresses_df.to_csv(missing_file, index=False)
+            print(f"✅ Missing addresses updated with coordinates in: {missing_file}")
+
+        # Broadcast the geocoded coordinates to every row at that address
+        # (numeric conversion runs over the unique addresses, and only blank rows are looked up)
+        for col in ["Latitude", "Longitude"]:
+            coord_map = dict(zip(
+                missing_addresses_df["address"], pd.to_numeric(missing_addresses_df[col], errors="coerce")
+            ))
+            mask = merged_df[col].isna()
+            merged_df[col] = pd.to_numeric(merged_df[col], errors="coerce")
+            merged_df.loc[mask, col] = merged_df.loc[mask, "address"].map(coord_map)
 
         # Rename "address" to "Address" so it matches addresses_df
         new_addresses_df = missing_addresses_df.rename(columns={"address": "Address"}).copy()
@@ -144,19 +240,21 @@ def geocode(local_inspections_file):
         # Remove duplicates in case some addresses were already present
         addresses_df.drop_duplicates(subset=["Address"], keep="last", inplace=True)
 
-        # Re-upload updated addresses.csv to S3
-        updated_csv_buf = io.StringIO()
-        addresses_df.to_csv(updated_csv_buf, index=False)
+        # Re-upload updated addresses.parquet to S3
+        addresses_df["Latitude"] = pd.to_numeric(addresses_df["Latitude"], errors="coerce")
+        addresses_df["Longitude"] = pd.to_numeric(addresses_df["Longitude"], errors="coerce")
+        updated_buf = io.BytesIO()
+        addresses_df.to_parquet(updated_buf, compression="zstd", index=False)
 
         try:
             s3_client.put_object(
                 Bucket=S3_BUCKET_NAME,
-                Key=addresses_s3_key,
-                Body=updated_csv_buf.getvalue()
+                Key=ADDRESSES_S3_KEY,
+                Body=updated_buf.getvalue()
             )
-            print("✅ Updated addresses.csv re-uploaded to S3.")
+            print("✅ Updated addresses.parquet re-uploaded to S3.")
         except Exception as e:
-            print(f"❌ Error uploading updated addresses.csv to S3: {e}")
+            print(f"❌ Error uploading updated addresses.parquet to S3: {e}")
 
     else:
         print("✅ No missing addresses found.")
@@ -164,7 +262,8 @@ def geocode(local_inspections_file):
     # Save the merged dataframe
     merged_file = local_inspections_file
     try:
-        merged_df.to_excel(merged_file, index=False)
+        write_excel(merged_df, merged_file)
+        write_snapshot(merged_df, merged_file)
         print(f"✅ Merged data with lat/long saved as: {merged_file}")
     except Exception as e:
         print(f"❌ Error saving merged Excel file: {e}")
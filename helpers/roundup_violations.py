@@ -1,9 +1,9 @@
-import re
-import shutil
 import os
 import pandas as pd
 from playwright.sync_api import sync_playwright, TimeoutError
 from helpers.cleaner import clean_data
+from helpers._powerbi import REPORT_IFRAME_SELECTOR
+from helpers.workbook_cache import write_excel
 
 
 def main():
@@ -13,16 +13,21 @@ def main():
     start_url = "http://cedatareporting.pa.gov/reports/powerbi/Public/AG/FS/PBI/Food_Safety_Inspections"
 
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless, slow_mo=500)
-        context = browser.new_context(accept_downloads=True)
-        page = context.new_page()
+        # A persistent profile keeps the Power BI bundle in the browser cache between runs
+        browser = p.chromium.launch_persistent_context(
+            os.getenv("PLAYWRIGHT_PROFILE_DIR", ".pw-profile"),
+            headless=headless,
+            # slow_mo pauses before every action; only worth it when watching a headed run
+            slow_mo=0 if headless else 100,
+            accept_downloads=True,
+        )
+        page = browser.pages[0] if browser.pages else browser.new_page()
         page.goto(start_url)
 
-        page.wait_for_timeout(20000)
-
-        # Identify the Power BI iframe
-        report_frame = page.frame(url=re.compile(r"cedatareporting\.pa\.gov/powerbi/\?id="))
-        if not report_frame:
+        # Identify the Power BI iframe, waiting on it rather than a fixed sleep
+        try:
+            page.wait_for_selector(REPORT_IFRAME_SELECTOR, state="attached", timeout=30000)
+        except TimeoutError:
             print("Could not find the main Power BI report frame.")
             browser.close()
             return
@@ -35,12 +40,16 @@ def main():
                 print(f"\nProcessing: {file_slug}")
 
                 page.goto(start_url)
-                page.wait_for_timeout(20000)
 
-                report_frame = page.frame(url=re.compile(r"cedatareporting\.pa\.gov/powerbi/\?id="))
+                try:
+                    iframe = page.wait_for_selector(REPORT_IFRAME_SELECTOR, state="attached", timeout=30000)
+                except TimeoutError:
+                    iframe = None
+                report_frame = iframe.content_frame() if iframe else None
                 if not report_frame:
                     print("Could not find report frame after reload.")
                     continue
+                report_frame.wait_for_load_state("domcontentloaded")
 
                 tab_locator = report_frame.locator("text=Violation Details")
                 try:
@@ -51,10 +60,9 @@ def main():
                     print("Violation Details tab not found.")
                     continue
 
-                report_frame.wait_for_timeout(10000)
-
                 focus_div = report_frame.locator(".imageBackground").first
                 try:
+                    focus_div.wait_for(state="visible", timeout=30000)
                     focus_div.click(timeout=15000, force=True)
                     print("Clicked into report area.")
                 except Exception as e:
@@ -101,13 +109,15 @@ def main():
                     hover_element.wait_for(state="visible", timeout=30000)
                     hover_element.hover()
                     button_locator.click()
-                    page.wait_for_timeout(2000)
+                    try:
+                        report_frame.locator("[role=menu]").first.wait_for(state="visible", timeout=5000)
+                    except TimeoutError:
+                        page.wait_for_timeout(2000)
                     page.keyboard.press("Enter")
                     page.wait_for_timeout(500)
 
                     for _ in range(4):
                         page.keyboard.press("Tab")
-                        page.wait_for_timeout(200)
 
                     county_path = f"data/{file_slug}.xlsx"
                     os.makedirs("data", exist_ok=True)
@@ -116,15 +126,15 @@ def main():
                         print(f"Downloading {file_slug}...")
 
                     dl = dl_info.value
-                    shutil.copy(dl.path(), county_path)
+                    dl.save_as(county_path)
                     print(f"Saved: {county_path}")
 
-                    clean_data(county_path)
+                    clean_data(county_path, snapshot=False)
                     print(f"Cleaned: {county_path}")
 
-                    df = pd.read_excel(county_path)
+                    df = pd.read_excel(county_path, engine="calamine")
                     df["county"] = county_search
-                    df.to_excel(county_path, index=False)
+                    write_excel(df, county_path)
                     print(f"Stamped county={county_search}")
 
                 except Exception as e:
@@ -137,14 +147,14 @@ def main():
         dfs = []
         for f in all_files:
             if os.path.exists(f):
-                dfs.append(pd.read_excel(f))
+                dfs.append(pd.read_excel(f, engine="calamine"))
             else:
                 print(f"⚠️ Missing file, skipping: {f}")
 
         if dfs:
             roundup = pd.concat(dfs, ignore_index=True)
             roundup_path = "data/roundup.xlsx"
-            roundup.to_excel(roundup_path, index=False)
+            write_excel(roundup, roundup_path)
             print(f"\n✅ Merged roundup saved: {roundup_path} ({len(roundup)} rows)")
 
             from helpers.roundup_violations_generator import generate_roundup_from_violations
@@ -153,7 +163,6 @@ def main():
         else:
             print("⚠️ No files to merge.")
 
-        page.wait_for_timeout(5000)
         browser.close()
 
 
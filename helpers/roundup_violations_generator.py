@@ -7,6 +7,7 @@ from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
+from helpers.workbook_cache import read_excel_str
 
 
 def add_hyperlink(paragraph, text, url):
@@ -82,7 +83,7 @@ def generate_roundup_from_violations(roundup_path, county_slug):
         # Join ai_summary + risk_level from main inspections file
         inspections_path = "data/inspections.xlsx"
         try:
-            insp = pd.read_excel(inspections_path, dtype=str)
+            insp = read_excel_str(inspections_path)
             join_cols = [c for c in ["facility", "inspection_date", "ai_summary", "risk_level"] if c in insp.columns]
             if "facility" in join_cols and "inspection_date" in join_cols:
                 insp = insp[join_cols].drop_duplicates(subset=["facility", "inspection_date"])
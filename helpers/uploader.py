@@ -2,7 +2,10 @@ import boto3
 import os
 import gzip
 import pandas as pd
+from boto3.s3.transfer import TransferConfig
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from helpers._s3 import get_s3_client
 
 # Load environment variables
 load_dotenv()
@@ -13,16 +16,19 @@ AWS_SECRET_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 AWS_REGION = os.getenv("AWS_REGION")
 
+# Multipart uploads in 8MB parts, several parts in flight at once
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
 def upload_to_s3(file_path, s3_key_override=None):
     # For non-Excel files, upload directly without CSV conversion
     if not file_path.endswith(".xlsx"):
         try:
-            s3_client = boto3.client(
-                "s3",
-                aws_access_key_id=AWS_ACCESS_KEY,
-                aws_secret_access_key=AWS_SECRET_KEY,
-                region_name=AWS_REGION
-            )
+            s3_client = get_s3_client()
             s3_object_key = s3_key_override if s3_key_override else f"2025/restaurant-inspections/{os.path.basename(file_path)}"
             content_types = {
                 ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
@@ -35,7 +41,8 @@ def upload_to_s3(file_path, s3_key_override=None):
                 file_path,
                 S3_BUCKET_NAME,
                 s3_object_key,
-                ExtraArgs={"ACL": "public-read", "ContentType": content_type}
+                ExtraArgs={"ACL": "public-read", "ContentType": content_type},
+                Config=TRANSFER_CONFIG
             )
             url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_object_key}"
             print(f"Uploaded {os.path.basename(file_path)} to S3.")
@@ -52,12 +59,7 @@ def upload_to_s3(file_path, s3_key_override=None):
         if not AWS_ACCESS_KEY or not AWS_SECRET_KEY or not S3_BUCKET_NAME or not AWS_REGION:
             raise ValueError("❌ Missing AWS credentials or S3 bucket name in environment variables.")
 
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_KEY,
-            region_name=AWS_REGION
-        )
+        s3_client = get_s3_client()
 
         # Convert XLSX to CSV
         print("Converting XLSX to CSV...")
@@ -67,78 +69,73 @@ def upload_to_s3(file_path, s3_key_override=None):
         csv_file_path = file_path.replace('.xlsx', '.csv')
         csv_gz_file_path = csv_file_path + '.gz'
         
-        # Export to CSV with UTF-8 encoding
-        df.to_csv(
-            csv_file_path, 
-            index=False,
-            encoding='utf-8',
-            escapechar='\\',
-            doublequote=True,
-            lineterminator='\n'
-        )
-        
-        print(f"CSV created: {csv_file_path}")
+        # Export straight into a gzip stream with UTF-8 encoding (no intermediate CSV on disk)
+        print("🗜️  Writing gzipped CSV...")
+        with gzip.open(csv_gz_file_path, 'wt', compresslevel=6, encoding='utf-8', newline='') as f_out:
+            df.to_csv(
+                f_out, 
+                index=False,
+                escapechar='\\',
+                doublequote=True,
+                lineterminator='\n'
+            )
         
-        # Compress CSV with gzip
-        print("🗜️  Compressing CSV with gzip...")
-        with open(csv_file_path, 'rb') as f_in:
-            with gzip.open(csv_gz_file_path, 'wb', compresslevel=9) as f_out:
-                f_out.writelines(f_in)
+        print(f"CSV.GZ created: {csv_gz_file_path}")
         
         # Get file sizes for comparison
         xlsx_size = os.path.getsize(file_path) / (1024 * 1024)
-        csv_size = os.path.getsize(csv_file_path) / (1024 * 1024)
         csv_gz_size = os.path.getsize(csv_gz_file_path) / (1024 * 1024)
         
         print(f"File size comparison:")
         print(f"   XLSX:     {xlsx_size:.2f}MB")
-        print(f"   CSV:      {csv_size:.2f}MB")
         print(f"   CSV.GZ:   {csv_gz_size:.2f}MB ⭐ (saved {xlsx_size - csv_gz_size:.2f}MB)")
 
         # Upload gzipped CSV to S3
         csv_gz_file_name = os.path.basename(csv_gz_file_path)
         s3_object_key = s3_key_override if s3_key_override else f"2025/restaurant-inspections/{csv_gz_file_name}"
 
-        s3_client.upload_file(
-            csv_gz_file_path, 
-            S3_BUCKET_NAME, 
-            s3_object_key,
-            ExtraArgs={
-                'ACL': 'public-read',
-                'ContentType': 'text/csv',
-                'ContentEncoding': 'gzip',
-                'CacheControl': 'max-age=300'
-            }
-        )
+        # Also upload the original XLSX as backup
+        xlsx_file_name = os.path.basename(file_path)
+        xlsx_s3_key = f"2025/restaurant-inspections/{xlsx_file_name}"
+
+        # The two keys are independent, so upload them side by side
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            csv_gz_upload = executor.submit(
+                s3_client.upload_file,
+                csv_gz_file_path, 
+                S3_BUCKET_NAME, 
+                s3_object_key,
+                ExtraArgs={
+                    'ACL': 'public-read',
+                    'ContentType': 'text/csv',
+                    'ContentEncoding': 'gzip',
+                    'CacheControl': 'max-age=300'
+                },
+                Config=TRANSFER_CONFIG
+            )
+            xlsx_upload = executor.submit(
+                s3_client.upload_file,
+                file_path, 
+                S3_BUCKET_NAME, 
+                xlsx_s3_key,
+                ExtraArgs={
+                    'ACL': 'public-read',
+                    'ContentType': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                    'CacheControl': 'max-age=300'
+                },
+                Config=TRANSFER_CONFIG
+            )
+            csv_gz_upload.result()
+            xlsx_upload.result()
         
         csv_gz_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{s3_object_key}"
         print(f"Gzipped CSV uploaded to S3 with public read access.")
         print(f"CSV.GZ URL: {csv_gz_url}")
 
-        # Also upload the original XLSX as backup
-        xlsx_file_name = os.path.basename(file_path)
-        xlsx_s3_key = f"2025/restaurant-inspections/{xlsx_file_name}"
-        
-        s3_client.upload_file(
-            file_path, 
-            S3_BUCKET_NAME, 
-            xlsx_s3_key,
-            ExtraArgs={
-                'ACL': 'public-read',
-                'ContentType': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                'CacheControl': 'max-age=300'
-            }
-        )
-        
         xlsx_url = f"https://{S3_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/{xlsx_s3_key}"
         print(f"XLSX uploaded to S3 as backup.")
         print(f"XLSX URL: {xlsx_url}")
         
-        # Clean up temporary files
-        if os.path.exists(csv_file_path):
-            os.remove(csv_file_path)
-            print(f"Cleaned up temporary CSV file")
-        
         return csv_gz_url
 
     except boto3.exceptions.S3UploadFailedError as e:
@@ -1,38 +1,34 @@
 import re
-import io
 import os
-import boto3
 import pandas as pd
+from helpers._s3 import get_s3_client
+from helpers.csv_helper import read_csv_str
+from helpers.workbook_cache import read_excel_str, write_excel, write_snapshot
 
-def clean_violation_code(code: str) -> str:
+_PAREN_RE = re.compile(r'\([^)]*\)')
+_HYPHEN_RE = re.compile(r'\s*-\s*')
+_LETTERS_RE = re.compile(r'[a-zA-Z]')
+_WS_RE = re.compile(r'\s+')
 
-    # Remove letters and parentheses from violation code
-    if pd.isna(code):
-        return ""
-    
-    code = str(code).strip()
-    
-    # Remove everything in parentheses and the parentheses
-    cleaned = re.sub(r'\([^)]*\)', '', code)
-    
-    # Normalize spaces around hyphens
-    cleaned = re.sub(r'\s*-\s*', ' - ', cleaned)
-    
-    # Remove any remaining letters
-    cleaned = re.sub(r'[a-zA-Z]', '', cleaned)
-    
-    # Clean up any multiple spaces
-    cleaned = re.sub(r'\s+', ' ', cleaned)
-    
-    # Remove trailing hyphens, periods, and spaces
-    cleaned = cleaned.rstrip('- .')
-    
-    # Remove leading hyphens, periods, and spaces
-    cleaned = cleaned.lstrip('- .')
-    
-    # Final trim
-    cleaned = cleaned.strip()
-    
+def clean_violation_code_series(codes: pd.Series) -> pd.Series:
+    """
+    Clean violation codes as vectorized str operations: drop parenthesized text and
+    letters, normalize spaces around hyphens, and trim stray hyphens/periods/spaces.
+    """
+    codes = codes.fillna("").astype(str).str.strip()
+    # Digit-only codes are already clean, so only the rest go through the regex passes
+    needs_cleaning = ~codes.str.isdigit()
+    cleaned = codes.copy()
+    cleaned[needs_cleaning] = (
+        codes[needs_cleaning]
+        .str.replace(_PAREN_RE, '', regex=True)
+        .str.replace(_HYPHEN_RE, ' - ', regex=True)
+        .str.replace(_LETTERS_RE, '', regex=True)
+        .str.replace(_WS_RE, ' ', regex=True)
+        .str.rstrip('- .')
+        .str.lstrip('- .')
+        .str.strip()
+    )
     return cleaned
 
 def translate_priority_to_risk(priority_level: str) -> str:
@@ -58,7 +54,7 @@ def translate_priority_to_risk(priority_level: str) -> str:
 def join_violation_details(local_inspections_file: str) -> bool:
     try:
         # Load inspections
-        df = pd.read_excel(local_inspections_file, dtype=str)
+        df = read_excel_str(local_inspections_file)
         print(f"Loaded inspections file with {len(df)} rows")
         
         if "violation_code" not in df.columns:
@@ -75,18 +71,13 @@ def join_violation_details(local_inspections_file: str) -> bool:
             print("Missing AWS credentials for food-codes download")
             return False
             
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=AWS_ACCESS_KEY,
-            aws_secret_access_key=AWS_SECRET_KEY,
-            region_name=AWS_REGION
-        )
+        s3_client = get_s3_client()
         
         food_codes_key = "2025/restaurant-inspections/food-codes.csv"
         
         try:
             s3_obj = s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=food_codes_key)
-            food_codes = pd.read_csv(io.BytesIO(s3_obj["Body"].read()), dtype=str)
+            food_codes = read_csv_str(s3_obj["Body"])
             print(f"Loaded food-codes.csv from S3 with {len(food_codes)} codes")
         except s3_client.exceptions.NoSuchKey:
             print(f"food-codes.csv not found at s3://{S3_BUCKET_NAME}/{food_codes_key}")
@@ -104,80 +95,58 @@ def join_violation_details(local_inspections_file: str) -> bool:
         # Strip whitespace from Requirement column and create lookup dict
         food_codes["Requirement"] = food_codes["Requirement"].fillna("").astype(str).str.strip()
         
-        # Create lookup dictionaries
-        lookup = {}
-        for _, row in food_codes.iterrows():
-            req = row["Requirement"]
-            if req:
-                lookup[req] = {
-                    "spotlight_pa": row.get("Spotlight PA Category", ""),
-                    "priority_level": row.get("Priority Level", ""),
-                    "requirement_description": row.get("Requirement Description", "")
-                }
+        # Create lookup table (later duplicate Requirements win, as with a dict)
+        lookup_df = (
+            food_codes[food_codes["Requirement"] != ""]
+            .drop_duplicates("Requirement", keep="last")
+            .set_index("Requirement")[["Spotlight PA Category", "Priority Level", "Requirement Description"]]
+            .fillna("")
+        )
         
-        print(f"Created lookup dictionary with {len(lookup)} violation codes")
+        print(f"Created lookup dictionary with {len(lookup_df)} violation codes")
         
-        # Track unique missing codes
-        missing_codes = set()
+        # Translate each distinct priority level once; there are only a handful
+        lookup_df["Priority Level"] = lookup_df["Priority Level"].astype("category")
+        prio_to_risk = {p: translate_priority_to_risk(p) for p in lookup_df["Priority Level"].cat.categories}
         
-        # Process each row
-        spotlight_pa_list = []
-        priority_level_list = []
-        risk_level_list = []
-        requirement_description_list = []
+        # Rows with a blank violation_code get blank detail columns. The text columns are held
+        # as Arrow strings so strip/compare run as Arrow kernels rather than per-object calls.
+        violation_codes = df["violation_code"].astype(str).astype("string[pyarrow]")
+        original_descriptions = (
+            df["violation_description"].astype(str) if "violation_description" in df.columns
+            else pd.Series("", index=df.index)
+        ).astype("string[pyarrow]")
+        has_codes = violation_codes.str.strip() != ""
         
-        for idx, row in df.iterrows():
-            violation_codes = str(row.get("violation_code", ""))
-            original_descriptions = str(row.get("violation_description", ""))
-            
-            if pd.isna(violation_codes) or violation_codes.strip() == "":
-                spotlight_pa_list.append("")
-                priority_level_list.append("")
-                risk_level_list.append("")
-                requirement_description_list.append("")
-                continue
-                
-            # Split by pipe
-            codes = [c.strip() for c in violation_codes.split("|")]
-            descriptions = [d.strip() for d in original_descriptions.split("|")]
-            
-            # Pad descriptions list if it's shorter than codes list
-            while len(descriptions) < len(codes):
-                descriptions.append("")
-            
-            # Clean each code and look up details
-            spotlight_parts = []
-            priority_parts = []
-            risk_parts = []
-            description_parts = []
-            
-            for i, code in enumerate(codes):
-                cleaned_code = clean_violation_code(code)
-                original_desc = descriptions[i] if i < len(descriptions) else ""
-                
-                if cleaned_code in lookup:
-                    details = lookup[cleaned_code]
-                    spotlight_parts.append(details["spotlight_pa"])
-                    priority_parts.append(details["priority_level"])
-                    # Translate priority to risk
-                    risk_parts.append(translate_priority_to_risk(details["priority_level"]))
-                    description_parts.append(details["requirement_description"])
-                else:
-                    # Track unique missing codes
-                    if cleaned_code and cleaned_code not in missing_codes:
-                        missing_codes.add(cleaned_code)
-                    
-                    # Use "NA" for missing values
-                    spotlight_parts.append("NA")
-                    priority_parts.append("NA")
-                    risk_parts.append("NA")
-                    description_parts.append(original_desc)
-            
-            # Join with pipes
-            spotlight_pa_list.append(" | ".join(spotlight_parts))
-            priority_level_list.append(" | ".join(priority_parts))
-            risk_level_list.append(" | ".join(risk_parts))
-            requirement_description_list.append(" | ".join(description_parts))
+        # One row per (inspection row, code); descriptions line up by position, padded with ""
+        codes = violation_codes[has_codes].str.split("|").explode().astype("string[pyarrow]").str.strip()
+        position = codes.groupby(level=0).cumcount()
+        descriptions = original_descriptions[has_codes].str.split("|").explode().astype("string[pyarrow]").str.strip()
+        descriptions.index = pd.MultiIndex.from_arrays([descriptions.index, descriptions.groupby(level=0).cumcount()])
+        
+        # Clean every distinct code once up front instead of once per occurrence
+        raw_codes = pd.Series(codes.unique())
+        cleaned_codes = dict(zip(raw_codes, clean_violation_code_series(raw_codes)))
+        
+        exploded = pd.DataFrame({
+            "row": codes.index,
+            "code_clean": codes.map(cleaned_codes).to_numpy(),
+            "original_desc": descriptions.reindex(pd.MultiIndex.from_arrays([codes.index, position])).fillna("").to_numpy(),
+        }).join(lookup_df, on="code_clean")
+        found = exploded["code_clean"].isin(lookup_df.index)
+        
+        # Use "NA" for missing values, original description for requirement_description
+        exploded["spotlight_pa"] = exploded["Spotlight PA Category"].where(found, "NA")
+        exploded["priority_level"] = exploded["Priority Level"].astype(object).where(found, "NA")
+        exploded["risk_level"] = exploded["Priority Level"].map(prio_to_risk).astype(object).where(found, "NA")
+        exploded["requirement_description"] = exploded["Requirement Description"].where(found, exploded["original_desc"])
+        
+        # Track unique missing codes
+        missing_codes = set(exploded.loc[~found & (exploded["code_clean"] != ""), "code_clean"])
+        
+        # Join with pipes, back in original row order
+        detail_cols = ["spotlight_pa", "priority_level", "risk_level", "requirement_description"]
+        joined = exploded.groupby("row", sort=False)[detail_cols].agg(" | ".join)
         
         # Report unique missing codes
         if missing_codes:
@@ -187,13 +156,11 @@ def join_violation_details(local_inspections_file: str) -> bool:
                 print(f"   - {code}")
         
         # Add new columns to dataframe
-        df["spotlight_pa"] = spotlight_pa_list
-        df["priority_level"] = priority_level_list
-        df["risk_level"] = risk_level_list
-        df["requirement_description"] = requirement_description_list
+        df[detail_cols] = joined.reindex(df.index, fill_value="")
         
         # Save back to Excel
-        df.to_excel(local_inspections_file, index=False)
+        write_excel(df, local_inspections_file)
+        write_snapshot(df, local_inspections_file)
         print(f"\nAdded violation details columns to {local_inspections_file}")
         
         return True
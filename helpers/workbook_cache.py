@@ -0,0 +1,73 @@
+import os
+import datetime
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+# The strings read_excel turns into NaN by default (pandas' na_values)
+_EXCEL_NA = {
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+}
+
+def _sidecar_path(xlsx_path: str) -> str:
+    return xlsx_path + ".parquet"
+
+def _excel_str(v):
+    # Mirror what read_excel(dtype=str) hands back for a cell written by to_excel
+    if v is None or v is pd.NaT or (isinstance(v, float) and v != v):
+        return None
+    if isinstance(v, str) and v in _EXCEL_NA:
+        return None
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    if isinstance(v, datetime.datetime):
+        return str(pd.Timestamp(v))
+    return str(v)
+
+def write_excel(df: pd.DataFrame, xlsx_path: str) -> None:
+    """
+    df.to_excel(xlsx_path, index=False) through openpyxl's write-only mode, which streams
+    rows to disk instead of holding every cell of the workbook in memory. The header row
+    keeps pandas' bold/bordered style.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    thin = Side(style="thin")
+    header = []
+    for name in df.columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        header.append(cell)
+    ws.append(header)
+    for row in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+        ws.append(row)
+    wb.save(xlsx_path)
+
+def write_snapshot(df: pd.DataFrame, xlsx_path: str) -> None:
+    """
+    Save a string-typed parquet copy of a workbook that was just written with to_excel,
+    so later dtype=str readers can skip parsing the xlsx. Failures are non-fatal.
+    """
+    try:
+        df.map(_excel_str).astype(object).to_parquet(_sidecar_path(xlsx_path), engine="pyarrow", index=False)
+    except Exception as e:
+        print(f"ℹ️ Skipped parquet snapshot for {xlsx_path}: {e}")
+
+def read_excel_str(xlsx_path: str) -> pd.DataFrame:
+    """
+    pd.read_excel(xlsx_path, dtype=str), served from the parquet snapshot when it is
+    at least as new as the workbook (i.e. nothing has rewritten the xlsx since).
+    """
+    sidecar = _sidecar_path(xlsx_path)
+    try:
+        if os.path.getmtime(sidecar) >= os.path.getmtime(xlsx_path):
+            df = pd.read_parquet(sidecar, engine="pyarrow")
+            # Arrow hands back None for missing strings; read_excel gives NaN (and str() of it is "nan")
+            return df.where(df.notna())
+    except Exception:
+        pass
+    return pd.read_excel(xlsx_path, dtype=str, engine="calamine")
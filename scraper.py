@@ -1,15 +1,15 @@
-import re
 import shutil
 import os
-import boto3
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from playwright.sync_api import sync_playwright, TimeoutError
 
 from helpers.cleaner import clean_data
 from helpers.uploader import upload_to_s3
 from helpers.geocoder_helper import geocode
-from helpers.categories_helper import upsert_categories, join_categories_into_inspections
-from helpers.ai_labeler import label_categories_via_ai
+from helpers._s3 import get_s3_client
+from helpers._powerbi import REPORT_IFRAME_SELECTOR
+from helpers.workbook_cache import read_excel_str, write_excel, write_snapshot
 
 
 def main():
@@ -22,16 +22,12 @@ def main():
         # Sync data folder from S3 before anything else
     print("Syncing data folder from S3...")
     try:
-        s3_client = boto3.client(
-            "s3",
-            aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-            aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-            region_name=os.getenv("AWS_REGION")
-        )
+        s3_client = get_s3_client()
         bucket = os.getenv("S3_BUCKET_NAME")
         prefix = "2025/restaurant-inspections/"
         paginator = s3_client.get_paginator("list_objects_v2")
         os.makedirs("data", exist_ok=True)
+        downloads = {}
         for s3_page in paginator.paginate(Bucket=bucket, Prefix=prefix):
             for obj in s3_page.get("Contents", []):
                 key = obj["Key"]
@@ -40,8 +36,16 @@ def main():
                     continue
                 local_path = os.path.join("data", filename)
                 os.makedirs(os.path.dirname(local_path), exist_ok=True)
-                s3_client.download_file(bucket, key, local_path)
-                print(f"  Downloaded: {local_path}")
+                downloads[key] = local_path
+        # Every object lands in its own file, so fetch them side by side
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = {
+                executor.submit(s3_client.download_file, bucket, key, local_path): local_path
+                for key, local_path in downloads.items()
+            }
+            for future in as_completed(futures):
+                future.result()
+                print(f"  Downloaded: {futures[future]}")
         print("S3 sync complete.")
     except Exception as e:
         print(f"⚠️ S3 sync failed, continuing with local data: {e}")
@@ -68,9 +72,15 @@ def main():
     run_start = time.time()
 
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=headless, slow_mo=500)
-        context = browser.new_context(accept_downloads=True)
-        page = context.new_page()
+        # A persistent profile keeps the Power BI bundle in the browser cache between runs
+        browser = p.chromium.launch_persistent_context(
+            os.getenv("PLAYWRIGHT_PROFILE_DIR", ".pw-profile"),
+            headless=headless,
+            # slow_mo pauses before every action; only worth it when watching a headed run
+            slow_mo=0 if headless else 100,
+            accept_downloads=True,
+        )
+        page = browser.pages[0] if browser.pages else browser.new_page()
 
         failed_counties = []
         succeeded_counties = []
@@ -89,18 +99,20 @@ def main():
 
             try:
                 page.goto(start_url)
-                page.wait_for_timeout(20000)
 
-                report_frame = page.frame(url=re.compile(r"cedatareporting\.pa\.gov/powerbi/\?id="))
+                # Wait on the report iframe itself rather than a fixed sleep
+                iframe = page.wait_for_selector(REPORT_IFRAME_SELECTOR, state="attached", timeout=30000)
+                report_frame = iframe.content_frame()
                 if not report_frame:
                     raise Exception("Could not find Power BI iframe")
+                report_frame.wait_for_load_state("domcontentloaded")
 
                 tab_locator = report_frame.locator("text=Violation Details")
                 tab_locator.wait_for(state="visible", timeout=30000)
                 tab_locator.click()
-                report_frame.wait_for_timeout(10000)
 
                 focus_div = report_frame.locator(".imageBackground").first
+                focus_div.wait_for(state="visible", timeout=30000)
                 focus_div.click(timeout=15000, force=True)
                 page.wait_for_timeout(500)
 
@@ -140,24 +152,27 @@ def main():
                 hover_element.wait_for(state="visible", timeout=30000)
                 hover_element.hover()
                 button_locator.click()
-                page.wait_for_timeout(2000)
+                try:
+                    report_frame.locator("[role=menu]").first.wait_for(state="visible", timeout=5000)
+                except TimeoutError:
+                    page.wait_for_timeout(2000)
 
                 page.keyboard.press("Enter")
                 page.wait_for_timeout(500)
 
                 for _ in range(4):
                     page.keyboard.press("Tab")
-                    page.wait_for_timeout(200)
 
                 with page.expect_download(timeout=120000) as dl_info:
                     page.keyboard.press("Enter")
 
                 dl = dl_info.value
-                shutil.copy(dl.path(), tmp_path)
+                dl.save_as(tmp_path)
 
-                clean_data(tmp_path)
-
-                df = pd.read_excel(tmp_path)
+                # clean_data hands back what it saved, so there is no need to re-read it
+                df = clean_data(tmp_path, snapshot=False)
+                if df is None:
+                    raise Exception("Cleaning failed")
                 row_count = len(df)
 
                 if row_count == 0:
@@ -167,8 +182,9 @@ def main():
                     print(f"⚠️ WARNING: {county} has {row_count} rows — may be hitting export cap")
 
                 df["county"] = slug
-                df.to_excel(tmp_path, index=False)
+                write_excel(df, tmp_path)
                 shutil.move(tmp_path, county_path)
+                write_snapshot(df, county_path)
                 print(f"✅ [{i}/{len(COUNTIES)}] {county} — {row_count} rows")
                 succeeded_counties.append(county)
 
@@ -192,7 +208,7 @@ def main():
         slug = county.lower()
         county_path = f"data/counties/{slug}.xlsx"
         if os.path.exists(county_path):
-            county_dfs.append(pd.read_excel(county_path, dtype=str))
+            county_dfs.append(read_excel_str(county_path))
         else:
             print(f"⚠️ Missing county file: {county_path}")
 
@@ -206,7 +222,7 @@ def main():
 
     enrich_cols = ["Latitude", "Longitude", "spotlight_pa", "priority_level", "risk_level", "requirement_description", "ai_summary"]
     if os.path.exists(destination_path):
-        existing = pd.read_excel(destination_path, dtype=str)
+        existing = read_excel_str(destination_path)
         existing_enrich = existing[["facility", "address", "inspection_date"] + [c for c in enrich_cols if c in existing.columns]].drop_duplicates(subset=["facility", "address", "inspection_date"])
         fresh = fresh.merge(existing_enrich, on=["facility", "address", "inspection_date"], how="left")
         print(f"Preserved enriched data for matching rows")
@@ -229,18 +245,18 @@ def main():
     fresh = fresh.sort_values("_sort_date", ascending=False).drop(columns=["_sort_date"])
     fresh = fresh.reset_index(drop=True)
 
-    fresh.to_excel(destination_path, index=False)
+    # Drop Latitude/Longitude so geocoder can merge them fresh from the saved addresses
+    if "Latitude" in fresh.columns:
+        fresh.drop(columns=["Latitude", "Longitude"], inplace=True)
+
+    write_excel(fresh, destination_path)
+    write_snapshot(fresh, destination_path)
     print(f"Saved merged inspections to {destination_path}")
 
     # Join violation details for rows missing risk_level
     from helpers.violations_helper import join_violation_details
     join_violation_details(destination_path)
 
-    # Drop Latitude/Longitude so geocoder can merge them fresh from addresses.csv
-    _df_pre_geo = pd.read_excel(destination_path, dtype=str)
-    if "Latitude" in _df_pre_geo.columns:
-        _df_pre_geo.drop(columns=["Latitude", "Longitude"], inplace=True)
-        _df_pre_geo.to_excel(destination_path, index=False)
     geocode(destination_path)
 
     # Add AI summaries
@@ -251,7 +267,7 @@ def main():
     upload_to_s3(destination_path)
 
     # Re-read final file for notify
-    df_final = pd.read_excel(destination_path)
+    df_final = pd.read_excel(destination_path, engine="calamine")
 
     # Detect new inspections and trigger notifications
     from helpers.notifier import detect_and_notify
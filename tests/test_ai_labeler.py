@@ -0,0 +1,54 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from helpers import ai_labeler
+
+
+class BatchApiFlagTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+
+    def _label(self, flag_value):
+        inspections = pd.DataFrame({"facility": ["Joe's Grill"], "address": ["1 Main St."], "city": ["York"]})
+        categories = pd.DataFrame({"facility": ["Joe's Grill"], "address": ["1 Main St."], "city": ["York"], "ai_category": [""]})
+        env = {"AI_USE_BATCH_API": flag_value, "AI_CACHE_PATH": os.path.join(self.tmp.name, "cache.sqlite")}
+
+        async def fake_pipeline(*args, **kwargs):
+            return []
+
+        with mock.patch.dict(os.environ, env), \
+             mock.patch.object(ai_labeler, "read_excel_str", return_value=inspections), \
+             mock.patch.object(ai_labeler, "_load_categories_df_from_s3_or_local", return_value=categories), \
+             mock.patch.object(ai_labeler, "_openai_client", return_value=object()) as client, \
+             mock.patch.object(ai_labeler, "_run_pipeline", side_effect=fake_pipeline) as pipeline, \
+             mock.patch.object(ai_labeler, "_run_batch_api", return_value=[]) as batch_api:
+            ai_labeler.label_categories_via_ai("inspections.xlsx")
+        return client, pipeline, batch_api
+
+    def test_false_keeps_direct_pipeline(self):
+        for value in ("false", "0", "no", ""):
+            with self.subTest(value=value):
+                client, pipeline, batch_api = self._label(value)
+                client.assert_called_once_with(use_async=True)
+                pipeline.assert_called_once()
+                batch_api.assert_not_called()
+
+    def test_true_uses_batch_api(self):
+        for value in ("true", "1", "YES "):
+            with self.subTest(value=value):
+                client, pipeline, batch_api = self._label(value)
+                client.assert_called_once_with(use_async=False)
+                pipeline.assert_not_called()
+                batch_api.assert_called_once()
+
+
+if __name__ == "__main__":
+    unittest.main()